@@ -0,0 +1,120 @@
+"""
+Micro-benchmark for the T5 editor pre/post processing.
+
+Compares the NumPy byte-level tokenizer and label decoding against the previous
+per-character Python implementation, checks that both produce identical output,
+and prints the timings.
+
+    python benchmarks/bench_editor.py --size 1000000
+"""
+
+import argparse
+import random
+import time
+from collections import defaultdict
+from itertools import chain
+
+import numpy as np
+
+from uparse.pipeline.pdf.marker.postprocessors.editor import apply_edit_labels
+from uparse.pipeline.pdf.marker.postprocessors.t5 import byt5_tokenize
+
+LABEL2ID = {"equal": 0, "delete": 1, "newline-1": 2, "space-1": 3}
+ID2LABEL = {v: k for k, v in LABEL2ID.items()}
+
+
+def legacy_byt5_tokenize(text: str, max_length: int, pad_token_id: int = 0):
+    byte_codes = []
+    for char in text:
+        byte_codes.append([byte + 3 for byte in char.encode("utf-8")])
+
+    tokens = list(chain.from_iterable(byte_codes))
+    char_token_lengths = [len(b) for b in byte_codes]
+
+    batched_tokens = []
+    attention_mask = []
+    for i in range(0, len(tokens), max_length):
+        batched_tokens.append(tokens[i : i + max_length])
+        attention_mask.append([1] * len(batched_tokens[-1]))
+
+    if len(batched_tokens[-1]) < max_length:
+        batched_tokens[-1] += [pad_token_id] * (max_length - len(batched_tokens[-1]))
+        attention_mask[-1] += [0] * (max_length - len(attention_mask[-1]))
+
+    return {
+        "input_ids": batched_tokens,
+        "attention_mask": attention_mask,
+        "char_token_lengths": char_token_lengths,
+    }
+
+
+def legacy_apply_edit_labels(text: str, token_masks: list[int], char_token_lengths: list[int]):
+    edit_stats = defaultdict(int)
+    out_text = []
+    start = 0
+    for i, char in enumerate(text):
+        char_token_length = char_token_lengths[i]
+        masks = token_masks[start : start + char_token_length]
+        labels = [ID2LABEL[mask] for mask in masks]
+        if all(label == "delete" for label in labels):
+            if char.strip():
+                out_text.append(char)
+            else:
+                edit_stats["delete"] += 1
+        elif labels[0] == "newline-1":
+            out_text.append("\n")
+            out_text.append(char)
+            edit_stats["newline-1"] += 1
+        elif labels[0] == "space-1":
+            out_text.append(" ")
+            out_text.append(char)
+            edit_stats["space-1"] += 1
+        else:
+            out_text.append(char)
+            edit_stats["equal"] += 1
+        start += char_token_length
+    return "".join(out_text), edit_stats
+
+
+def make_text(size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz     \n\t.,;-éüß中文数学∑∫αβ😀"
+    return "".join(rng.choice(alphabet) for _ in range(size))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the T5 editor tokenizer")
+    parser.add_argument("--size", type=int, default=1_000_000, help="Number of characters")
+    parser.add_argument("--max-length", type=int, default=1024, help="Tokens per item")
+    args = parser.parse_args()
+
+    text = make_text(args.size)
+
+    legacy, legacy_time = timed(legacy_byt5_tokenize, text, args.max_length)
+    fast, fast_time = timed(byt5_tokenize, text, args.max_length)
+    assert fast["input_ids"].tolist() == legacy["input_ids"]
+    assert fast["attention_mask"].tolist() == legacy["attention_mask"]
+    assert fast["char_token_lengths"].tolist() == legacy["char_token_lengths"]
+    print(f"tokenize: legacy {legacy_time:.3f}s, numpy {fast_time:.3f}s")
+
+    num_tokens = len(text.encode("utf-8"))
+    token_masks = np.random.default_rng(0).choice(4, size=num_tokens, p=[0.85, 0.05, 0.05, 0.05])
+    (legacy_text, legacy_stats), legacy_time = timed(
+        legacy_apply_edit_labels, text, token_masks.tolist(), legacy["char_token_lengths"]
+    )
+    (fast_text, fast_stats), fast_time = timed(
+        apply_edit_labels, text, token_masks, fast["char_token_lengths"], LABEL2ID
+    )
+    assert fast_text == legacy_text
+    assert fast_stats == legacy_stats
+    print(f"apply labels: legacy {legacy_time:.3f}s, numpy {fast_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
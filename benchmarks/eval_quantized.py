@@ -0,0 +1,71 @@
+"""
+Compare int8 quantized CPU models against fp32 on a fixed local sample set.
+
+Every file in the sample directory is parsed twice, once with fp32 models and once with
+dynamic int8 quantized models, and the similarity of the resulting texts and the parse
+times are reported per file.
+
+    python benchmarks/eval_quantized.py samples/
+"""
+
+import argparse
+import asyncio
+import pathlib
+import time
+
+from rapidfuzz import fuzz
+
+import uparse.models
+from uparse.routes.parse import pipelines
+
+
+async def parse_all(files: list[pathlib.Path], models) -> dict[str, tuple[str, float]]:
+    results = {}
+    for path in files:
+        for pipeline_cls in pipelines:
+            if path.suffix in pipeline_cls.allowed_extensions:
+                break
+        else:
+            continue
+        pipeline = pipeline_cls(models=models, batch_size=4)
+        start = time.perf_counter()
+        state = await pipeline({"uri": path.as_posix()})
+        doc = state["doc"]
+        text = doc.summary or "\n".join(c.content or "" for c in doc.get_chunks())
+        results[path.name] = (text, time.perf_counter() - start)
+    return results
+
+
+def load(quantize: bool):
+    uparse.models.g_models = None
+    start = time.perf_counter()
+    models = uparse.models.load_models(quantize=quantize)
+    return models, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate int8 quantized CPU models")
+    parser.add_argument("sample_dir", help="Directory with sample documents")
+    args = parser.parse_args()
+
+    files = sorted(p for p in pathlib.Path(args.sample_dir).iterdir() if p.is_file())
+
+    models, fp32_load = load(quantize=False)
+    fp32 = asyncio.run(parse_all(files, models))
+    models, int8_load = load(quantize=True)
+    int8 = asyncio.run(parse_all(files, models))
+
+    print(f"load: fp32 {fp32_load:.1f}s, int8 {int8_load:.1f}s")
+    print(f"{'file':40} {'similarity':>10} {'fp32 (s)':>9} {'int8 (s)':>9}")
+    similarities = []
+    for name, (fp32_text, fp32_time) in fp32.items():
+        int8_text, int8_time = int8[name]
+        similarity = fuzz.ratio(fp32_text, int8_text)
+        similarities.append(similarity)
+        print(f"{name[:40]:40} {similarity:10.2f} {fp32_time:9.2f} {int8_time:9.2f}")
+    if similarities:
+        print(f"mean similarity: {sum(similarities) / len(similarities):.2f}")
+
+
+if __name__ == "__main__":
+    main()
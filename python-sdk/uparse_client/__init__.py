@@ -1,4 +1,4 @@
-from ._types import Chunk, Document
+from ._types import Chunk, Document, JobStatus
 from .uparse import AsyncParse
 from .utils import decode_base64_to_image
 
@@ -6,5 +6,6 @@ __all__ = [
     "AsyncParse",
     "Document",
     "Chunk",
+    "JobStatus",
     "decode_base64_to_image",
 ]
@@ -0,0 +1,71 @@
+"""Local cache of parsed documents, keyed by the content of the file and the parse options."""
+
+import base64
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+
+from ._types import Document
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    """The sha256 of a file, read in chunks so memory stays flat on large files."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _bytes_to_base64(value):
+    # binary responses carry images as bytes, cached documents keep the JSON form
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("utf-8")
+    if isinstance(value, dict):
+        return {k: _bytes_to_base64(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_bytes_to_base64(v) for v in value]
+    return value
+
+
+class DocumentCache:
+    """Documents stored as JSON under `cache_dir`, one file per key.
+
+    The key covers the file content, its extension (which picks the server pipeline) and the
+    parse options, so a renamed copy of a file hits and the same file parsed differently
+    does not. Entries never expire, delete the directory to clear the cache.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = pathlib.Path(cache_dir)
+
+    def key(self, file_path: str, params: dict) -> str:
+        digest = hash_file(file_path)
+        suffix = os.path.splitext(file_path)[1].lower()
+        options = json.dumps(params, sort_keys=True)
+        return hashlib.sha256(f"{digest}:{suffix}:{options}".encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> pathlib.Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Document | None:
+        try:
+            return Document.model_validate_json(self.path(key).read_bytes())
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # a corrupt entry is a miss, it is overwritten by the next parse
+            return None
+
+    def put(self, key: str, doc: Document):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        content = json.dumps(_bytes_to_base64(doc.model_dump()), ensure_ascii=False)
+        # write aside and rename, concurrent readers never see a partial entry
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, delete=False) as f:
+            f.write(content)
+        os.replace(f.name, path)
@@ -1,4 +1,5 @@
 import inspect
+import random
 from typing import TYPE_CHECKING, Dict, Type, TypeVar, Union, cast
 
 import anyio
@@ -8,6 +9,7 @@ from httpx import URL
 from loguru import logger
 
 from ._constants import (
+    DEFAULT_CONNECTION_LIMITS,
     DEFAULT_MAX_RETRIES,
     DEFAULT_TIMEOUT,
     INITIAL_RETRY_DELAY,
@@ -48,10 +50,23 @@ class AsyncAPIClient:
         max_retries: int = DEFAULT_MAX_RETRIES,
         timeout: httpx.Timeout = DEFAULT_TIMEOUT,
         proxies: Union[None, httpx._types.ProxyTypes] = None,
+        limits: httpx.Limits = DEFAULT_CONNECTION_LIMITS,
     ):
-        self._client = httpx.AsyncClient(base_url=base_url, timeout=timeout, proxies=proxies)
+        # one pooled client per instance, connections are kept alive and reused
+        self._client = httpx.AsyncClient(
+            base_url=base_url, timeout=timeout, proxies=proxies, limits=limits
+        )
         self.max_retries = max_retries
 
+    async def close(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
     async def get_auth_headers(self) -> dict:
         return {}
 
@@ -75,8 +90,6 @@ class AsyncAPIClient:
             headers["Content-Type"] = "application/json; charset=utf-8"
         # if options.files is not None or options.data is not None and content_type is None:
         #     headers["Content-Type"] = "multipart/form-data"
-        # httpx uses connection pooling, uncompatible with asyncio
-        headers["Connection"] = "close"
         kwargs = {}
         if options.timeout is not None:
             kwargs["timeout"] = options.timeout
@@ -101,6 +114,11 @@ class AsyncAPIClient:
             return BadResponseError(msg=str(e), context={"response": response.text})
         return APIException(code=body["code"], msg=body.get("msg", ""), context=body)
 
+    def _retry_delay(self, attempt: int) -> float:
+        retry_timeout = min(INITIAL_RETRY_DELAY * 2**attempt, MAX_RETRY_DELAY)
+        # jitter, so clients failing together do not retry together
+        return random.uniform(retry_timeout / 2, retry_timeout)
+
     async def _retry_request(
         self,
         cast_to: Type[ResponseT],
@@ -113,8 +131,8 @@ class AsyncAPIClient:
         else:
             logger.debug(f"{remaining} retries left")
         max_retries = options.get_max_retries(self.max_retries)
-        retry_timeout = min(INITIAL_RETRY_DELAY * 2 ** (max_retries - remaining), MAX_RETRY_DELAY)
-        logger.info(f"Retrying {options.url} in {retry_timeout} seconds")
+        retry_timeout = self._retry_delay(max_retries - remaining)
+        logger.info(f"Retrying {options.url} in {retry_timeout:.2f} seconds")
         await anyio.sleep(retry_timeout)
 
         return await self._request(
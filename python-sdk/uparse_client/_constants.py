@@ -8,5 +8,7 @@ DEFAULT_CONNECTION_LIMITS = httpx.Limits(max_connections=1000, max_keepalive_con
 INITIAL_RETRY_DELAY = 0.5
 DEFAULT_RETRY_DELAY = 1.0
 MAX_RETRY_DELAY = 8.0
+DEFAULT_POLL_INTERVAL = 1.0
+MAX_STREAM_RECONNECTS = 5
 DEFAULT_WRITE_ROW_BATCH_SIZE = 4000
 DEFAULT_WRITE_COL_BATCH_SIZE = 90
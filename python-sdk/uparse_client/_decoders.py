@@ -0,0 +1,56 @@
+"""Decoders for the response formats of `/parse`, chosen from the `Content-Type`."""
+
+import json
+
+import httpx
+
+from ._types import DocumentResponse
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+RESPONSE_FORMATS = {
+    "json": JSON_MEDIA_TYPE,
+    "msgpack": MSGPACK_MEDIA_TYPE,
+    "arrow": ARROW_MEDIA_TYPE,
+}
+
+ARROW_RESPONSE_KEY = b"uparse.response"
+
+
+def decode_msgpack(content: bytes) -> dict:
+    import msgpack
+
+    return msgpack.unpackb(content)
+
+
+def decode_arrow(content: bytes) -> dict:
+    """Rebuild the response from an Arrow IPC stream, one row per (nested) chunk."""
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(content).read_all()
+    body = json.loads(table.schema.metadata[ARROW_RESPONSE_KEY])
+    rows = table.to_pylist()
+    chunks = []
+    for row in rows:
+        parent_row = row.pop("parent_row")
+        if row["metadata"] is not None:
+            row["metadata"] = json.loads(row["metadata"])
+        row["children"] = []
+        # parents always come before their children
+        (chunks if parent_row is None else rows[parent_row]["children"]).append(row)
+    if body.get("data") is not None:
+        body["data"]["chunks"] = chunks
+    return body
+
+
+def decode_document_response(response: httpx.Response) -> DocumentResponse:
+    media_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if media_type == MSGPACK_MEDIA_TYPE:
+        body = decode_msgpack(response.content)
+    elif media_type == ARROW_MEDIA_TYPE:
+        body = decode_arrow(response.content)
+    else:
+        body = response.json()
+    return DocumentResponse.model_validate(body)
@@ -109,24 +109,36 @@ class Document(BaseModel):
     chunks: list["Chunk"] = []
 
     def get_chunks(self) -> list["Chunk"]:
+        """The leaf chunks, in document order: chunks with children stand for them."""
         flatten_chunks = []
-        for chunk in self.chunks:
+        stack = list(reversed(self.chunks))
+        while stack:
+            chunk = stack.pop()
             if chunk.children:
-                flatten_chunks.extend(chunk.children)
+                stack.extend(reversed(chunk.children))
             else:
                 flatten_chunks.append(chunk)
         return flatten_chunks
 
-    def _add_chunk(self, chunk: "Chunk"):
-        chunk.doc_id = self.id
-        self.chunks.append(chunk)
+    def _add_chunks(self, chunks: list["Chunk"]):
+        for chunk in chunks:
+            chunk.doc_id = self.id
+        num_chunks = len(self.chunks)
+        self.chunks.extend(chunks)
+        if self.child_chunk_ids is None or len(self.child_chunk_ids) != num_chunks:
+            # first add, or chunks were assigned directly
+            self.child_chunk_ids = [c.id for c in self.chunks]
+        else:
+            self.child_chunk_ids.extend(c.id for c in chunks)
         self.num_chunks = len(self.chunks)
-        self.child_chunk_ids = [c.id for c in self.chunks]
+
+    def _add_chunk(self, chunk: "Chunk"):
+        self._add_chunks([chunk])
 
     def add_chunk(self, chunk: Union["Chunk", list["Chunk"]]):
+        """Append one chunk or a list of chunks, in time linear in the chunks added."""
         if isinstance(chunk, list):
-            for c in chunk:
-                self._add_chunk(c)
+            self._add_chunks(chunk)
         else:
             self._add_chunk(chunk)
 
@@ -168,8 +180,10 @@ class Chunk(BaseModel):
     content: str | None = None
     """chunk content"""
     image_name: str | None = None
-    image_content: str | None = None
-    """encoded image content"""
+    image_content: str | bytes | None = None
+    """encoded image content, base64 in JSON responses and raw bytes in binary ones"""
+    image_key: str | None = None
+    """key of the image on the server, see `AsyncParse.get_image`"""
     table_content: str | None = None
     """table content, decided by chunk_type"""
     num_tokens: int | None = None
@@ -209,8 +223,35 @@ class DocumentResponse(BaseResponse):
     data: Document
 
 
+class JobStatus(BaseModel):
+    id: str
+    status: Literal["pending", "running", "done", "failed"]
+    """pending/running 进行中，done 完成，failed 失败"""
+    num_chunks: int = 0
+    """已生成的 chunk 数"""
+    msg: str | None = None
+    """失败原因"""
+    process_time: float | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+
+class JobResponse(BaseResponse):
+    data: JobStatus
+
+
 class ParseParams(BaseModel):
     has_watermark: bool | None = None
     """是否有水印"""
     force_convert_pdf: bool | None = None
     """是否强制转换 PDF"""
+    stream: bool | None = None
+    """是否流式返回 chunk"""
+    images: Literal["inline", "ref", "none"] | None = None
+    """图片返回方式：inline 内嵌 base64，ref 只返回 image_key，none 不返回"""
+    max_tokens: int | None = None
+    """按 token 数重新切分 chunk，每个 chunk 最多 max_tokens 个 token"""
+    hierarchical: bool | None = None
+    """按标题和目录构建章节层级，段落作为章节 chunk 的 children（PDF）"""
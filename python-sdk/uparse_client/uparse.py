@@ -1,8 +1,38 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Literal
+
+import anyio
 import httpx
+from loguru import logger
 
+from ._cache import DocumentCache
 from ._client import AsyncAPIClient
-from ._constants import DEFAULT_MAX_RETRIES, DEFAULT_TIMEOUT
-from ._types import AllowedExtensionsResponse, Document, DocumentResponse, ParseParams
+from ._constants import (
+    DEFAULT_CONNECTION_LIMITS,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_POLL_INTERVAL,
+    DEFAULT_TIMEOUT,
+    MAX_STREAM_RECONNECTS,
+)
+from ._decoders import RESPONSE_FORMATS, decode_document_response
+from ._types import (
+    AllowedExtensionsResponse,
+    APIConnectionError,
+    APIException,
+    APITimeoutError,
+    Chunk,
+    Document,
+    DocumentResponse,
+    FinalRequestOptions,
+    JobResponse,
+    JobStatus,
+    ParseParams,
+)
+
+# a stream ends with a document event without data when the pipeline produced no document
+NO_DOCUMENT_MSG = "No document was parsed from the file"
 
 
 class AsyncParse(AsyncAPIClient):
@@ -11,9 +41,29 @@ class AsyncParse(AsyncAPIClient):
         base_url="http://localhost:8000",
         timeout: httpx.Timeout = DEFAULT_TIMEOUT,
         max_retries: int = DEFAULT_MAX_RETRIES,
+        limits: httpx.Limits = DEFAULT_CONNECTION_LIMITS,
+        cache_dir: str | None = None,
     ):
-        super().__init__(base_url=base_url, timeout=timeout, max_retries=max_retries)
+        """`cache_dir` keeps parsed documents on disk: parsing the same content with the
+        same options again returns the cached document without uploading anything."""
+        super().__init__(base_url=base_url, timeout=timeout, max_retries=max_retries, limits=limits)
         self.parse_endpoint = "parse"
+        self.cache = DocumentCache(cache_dir) if cache_dir else None
+
+    async def _cached(
+        self, file_path: str, params: dict, parse: Callable[[], Awaitable[Document]]
+    ) -> Document:
+        if self.cache is None:
+            return await parse()
+        # hashing reads the whole file, keep it off the event loop
+        key = await anyio.to_thread.run_sync(self.cache.key, file_path, params)
+        doc = await anyio.to_thread.run_sync(self.cache.get, key)
+        if doc is not None:
+            logger.debug(f"Cache hit for {file_path}")
+            return doc
+        doc = await parse()
+        await anyio.to_thread.run_sync(self.cache.put, key, doc)
+        return doc
 
     async def allowed_extensions(self) -> list[str]:
         res = await self.get(
@@ -28,16 +78,333 @@ class AsyncParse(AsyncAPIClient):
         has_watermark: bool | None = None,
         force_convert_pdf: bool | None = None,
         timeout: httpx.Timeout | None = None,
+        response_format: Literal["json", "msgpack", "arrow"] = "json",
+        images: Literal["inline", "ref", "none"] | None = None,
+        max_tokens: int | None = None,
+        hierarchical: bool | None = None,
+    ) -> Document:
+        """Parse a file.
+
+        `response_format` asks the server for a binary format, which is faster to encode
+        and decode for large documents and carries `image_content` as raw bytes instead of
+        base64. The server answers in JSON when it does not support the format.
+
+        `images="ref"` leaves images out of the response, chunks only carry an `image_key`
+        to fetch them with `get_image`; `images="none"` drops them altogether.
+
+        The file is streamed from disk in chunks rather than read into memory, and read
+        again from the start if the request is retried. With a `cache_dir`, a cached
+        document is returned without uploading; its images are always base64 strings.
+        """
+        params = ParseParams(
+            has_watermark=has_watermark,
+            force_convert_pdf=force_convert_pdf,
+            images=images,
+            max_tokens=max_tokens,
+            hierarchical=hierarchical,
+        ).model_dump(exclude_none=True)
+
+        async def parse():
+            with open(file_path, "rb") as f:
+                options = {"files": {"file": f}, "data": params, "timeout": timeout}
+                return await self._request_document(
+                    "post", self.parse_endpoint, options, response_format
+                )
+
+        return await self._cached(file_path, params, parse)
+
+    async def _request_document(
+        self,
+        method: str,
+        url: str,
+        options: dict,
+        response_format: Literal["json", "msgpack", "arrow"] = "json",
     ) -> Document:
-        res = await self.post(
-            self.parse_endpoint,
-            cast_to=DocumentResponse,
-            options={
-                "files": {"file": open(file_path, "rb")},
-                "data": ParseParams(
-                    has_watermark=has_watermark, force_convert_pdf=force_convert_pdf
-                ).model_dump(exclude_none=True),
-                "timeout": timeout,
-            },
+        if response_format == "json":
+            res = await self.request(
+                DocumentResponse, FinalRequestOptions(method=method, url=url, **options)
+            )
+            return res.data
+
+        options = {
+            **options,
+            "headers": {"Accept": RESPONSE_FORMATS[response_format]},
+            "raw_response": True,
+        }
+        response = await self.request(
+            httpx.Response, FinalRequestOptions(method=method, url=url, **options)
         )
+        res = decode_document_response(response)
+        if res.code != 200:
+            raise APIException(code=res.code, msg=res.msg, context=res.model_dump())
+        return res.data
+
+    async def parse_many(
+        self, file_paths: Iterable[str], concurrency: int = 8, **kwargs
+    ) -> AsyncIterator[tuple[str, Document | Exception]]:
+        """Parse many files over the pooled connections, at most `concurrency` at a time.
+
+        Yields `(file_path, result)` in completion order, not input order. The result is the
+        `Document`, or the exception that failed this file, so one bad file does not stop the
+        batch. `file_paths` is consumed lazily and `kwargs` are passed on to `parse`.
+        """
+        paths = iter(file_paths)
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def worker():
+            try:
+                # workers share the iterator, each takes the next path when it is free
+                for file_path in paths:
+                    try:
+                        result = await self.parse(file_path, **kwargs)
+                    except Exception as e:
+                        result = e
+                    await results.put((file_path, result))
+            finally:
+                await results.put(None)
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+        try:
+            running = len(workers)
+            while running:
+                item = await results.get()
+                if item is None:
+                    running -= 1
+                    continue
+                yield item
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def submit_job(
+        self,
+        file_path: str,
+        has_watermark: bool | None = None,
+        force_convert_pdf: bool | None = None,
+        timeout: httpx.Timeout | None = None,
+        images: Literal["inline", "ref", "none"] | None = None,
+        max_tokens: int | None = None,
+        hierarchical: bool | None = None,
+    ) -> JobStatus:
+        """Upload a file and start parsing it in the background.
+
+        The request returns as soon as the upload is stored, so long documents do not run
+        into the request timeout and a retry never re-uploads a file that is being parsed.
+        Follow the job with `wait_job` and `fetch_job`, or with `iter_job`.
+        """
+        with open(file_path, "rb") as f:
+            res = await self.post(
+                f"{self.parse_endpoint}/jobs",
+                cast_to=JobResponse,
+                options={
+                    "files": {"file": f},
+                    "data": ParseParams(
+                        has_watermark=has_watermark,
+                        force_convert_pdf=force_convert_pdf,
+                        images=images,
+                        max_tokens=max_tokens,
+                        hierarchical=hierarchical,
+                    ).model_dump(exclude_none=True),
+                    "timeout": timeout,
+                },
+            )
         return res.data
+
+    async def get_job(self, job_id: str) -> JobStatus:
+        res = await self.get(f"{self.parse_endpoint}/jobs/{job_id}", cast_to=JobResponse)
+        return res.data
+
+    async def wait_job(
+        self,
+        job_id: str,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        timeout: float | None = None,
+    ) -> JobStatus:
+        """Poll a job until it is done, raises `APIException` if it failed."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = await self.get_job(job_id)
+            if job.status == "failed":
+                raise APIException(code=500, msg=job.msg or "Job failed", context=job.model_dump())
+            if job.finished:
+                return job
+            if deadline is not None and time.monotonic() + poll_interval > deadline:
+                raise APITimeoutError(context=job.model_dump())
+            await anyio.sleep(poll_interval)
+
+    async def fetch_job(
+        self,
+        job_id: str,
+        timeout: httpx.Timeout | None = None,
+        response_format: Literal["json", "msgpack", "arrow"] = "json",
+    ) -> Document:
+        """Fetch the document of a finished job, see `parse` for `response_format`."""
+        return await self._request_document(
+            "get",
+            f"{self.parse_endpoint}/jobs/{job_id}/result",
+            {"timeout": timeout},
+            response_format,
+        )
+
+    async def parse_job(
+        self,
+        file_path: str,
+        has_watermark: bool | None = None,
+        force_convert_pdf: bool | None = None,
+        images: Literal["inline", "ref", "none"] | None = None,
+        max_tokens: int | None = None,
+        hierarchical: bool | None = None,
+        response_format: Literal["json", "msgpack", "arrow"] = "json",
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ) -> Document:
+        """Like `parse`, as a job: submit, poll until done, then fetch the document."""
+        params = ParseParams(
+            has_watermark=has_watermark,
+            force_convert_pdf=force_convert_pdf,
+            images=images,
+            max_tokens=max_tokens,
+            hierarchical=hierarchical,
+        ).model_dump(exclude_none=True)
+
+        async def parse():
+            job = await self.submit_job(
+                file_path,
+                has_watermark=has_watermark,
+                force_convert_pdf=force_convert_pdf,
+                images=images,
+                max_tokens=max_tokens,
+                hierarchical=hierarchical,
+            )
+            await self.wait_job(job.id, poll_interval=poll_interval)
+            return await self.fetch_job(job.id, response_format=response_format)
+
+        return await self._cached(file_path, params, parse)
+
+    async def iter_job(
+        self,
+        job_id: str,
+        offset: int = 0,
+        max_reconnects: int = MAX_STREAM_RECONNECTS,
+        timeout: httpx.Timeout | None = None,
+    ) -> AsyncIterator[Chunk | Document]:
+        """Yield the chunks of a job as the server produces them, then its `Document`.
+
+        A dropped or timed out connection is reopened after the chunks already received,
+        `max_reconnects` times in a row at most. Chunks are not kept, so memory stays flat
+        however large the document: the final `Document` carries `num_chunks` but no chunks.
+        `offset` skips chunks received earlier, e.g. by another process.
+        """
+        received = offset
+        reconnects = 0
+        while True:
+            request = await self._build_request(
+                FinalRequestOptions(
+                    method="get",
+                    url=f"{self.parse_endpoint}/jobs/{job_id}/stream",
+                    params={"offset": received},
+                    timeout=timeout,
+                )
+            )
+            try:
+                response = await self._client.send(request, stream=True)
+                try:
+                    if response.status_code != 200:
+                        await response.aread()
+                        raise self._make_status_error_from_response(response)
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        if event["event"] == "error":
+                            raise APIException(code=event["code"], msg=event["msg"], context=event)
+                        if event["event"] == "chunk":
+                            received += 1
+                            reconnects = 0
+                            yield Chunk.model_validate(event["data"])
+                        elif event["event"] == "document":
+                            if event["data"] is None:
+                                raise APIException(code=500, msg=NO_DOCUMENT_MSG, context=event)
+                            yield Document.model_validate(event["data"])
+                            return
+                finally:
+                    await response.aclose()
+                error = None
+            except httpx.TransportError as e:
+                error = e
+            # the stream broke off, with an error or before its final event
+            if reconnects >= max_reconnects:
+                raise APIConnectionError(
+                    context={"job_id": job_id, "received": received}
+                ) from error
+            retry_timeout = self._retry_delay(reconnects)
+            reconnects += 1
+            logger.info(
+                f"Resuming job {job_id} after {received} chunks in {retry_timeout:.2f} seconds"
+            )
+            await anyio.sleep(retry_timeout)
+
+    async def get_image(self, image_key: str, timeout: httpx.Timeout | None = None) -> bytes:
+        """Fetch the bytes of an image referenced by `Chunk.image_key`."""
+        response = await self.get(
+            f"{self.parse_endpoint}/blobs/{image_key}",
+            cast_to=httpx.Response,
+            options={"raw_response": True, "timeout": timeout, "headers": {"Accept": "*/*"}},
+        )
+        return response.content
+
+    async def parse_stream(
+        self,
+        file_path: str,
+        has_watermark: bool | None = None,
+        force_convert_pdf: bool | None = None,
+        timeout: httpx.Timeout | None = None,
+        images: Literal["inline", "ref", "none"] | None = None,
+        max_tokens: int | None = None,
+        hierarchical: bool | None = None,
+    ) -> AsyncIterator[Chunk | Document]:
+        """Parse a file in streaming mode.
+
+        Yields every `Chunk` as soon as the server produces it, then the complete
+        `Document` with all the chunks. A stream is not retried once it has started.
+        """
+        with open(file_path, "rb") as f:
+            request = await self._build_request(
+                FinalRequestOptions(
+                    method="post",
+                    url=self.parse_endpoint,
+                    files={"file": f},
+                    data=ParseParams(
+                        has_watermark=has_watermark,
+                        force_convert_pdf=force_convert_pdf,
+                        stream=True,
+                        images=images,
+                        max_tokens=max_tokens,
+                        hierarchical=hierarchical,
+                    ).model_dump(exclude_none=True),
+                    timeout=timeout,
+                )
+            )
+            response = await self._client.send(request, stream=True)
+        try:
+            if response.status_code != 200:
+                await response.aread()
+                raise self._make_status_error_from_response(response)
+            chunks = []
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["event"] == "error":
+                    raise APIException(code=event["code"], msg=event["msg"], context=event)
+                if event["event"] == "chunk":
+                    chunk = Chunk.model_validate(event["data"])
+                    chunks.append(chunk)
+                    yield chunk
+                elif event["event"] == "document":
+                    if event["data"] is None:
+                        raise APIException(code=500, msg=NO_DOCUMENT_MSG, context=event)
+                    doc = Document.model_validate({**event["data"], "chunks": chunks})
+                    yield doc
+        finally:
+            await response.aclose()
@@ -6,6 +6,7 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from uparse import get_all_models
 from uparse.routes.parse import router
+from uparse.storage import get_storage, start_retention
 from uparse.utils import clear_occupied_gpu
 
 app = FastAPI()
@@ -25,8 +26,18 @@ def on_app_startup():
     get_all_models()
 
 
+async def on_retention_startup():
+    start_retention(get_storage())
+
+
+def on_storage_shutdown():
+    get_storage().close()
+
+
 app.include_router(router, prefix="/parse")
 app.add_event_handler("startup", on_app_startup)
+app.add_event_handler("startup", on_retention_startup)
+app.add_event_handler("shutdown", on_storage_shutdown)
 
 
 def main():
@@ -40,6 +51,9 @@ def main():
 
     import uvicorn
 
+    if args.workers > 1:
+        print("[LOG] 🆘 Background parse jobs live in one worker, /parse/jobs needs --workers 1")
+
     clear_occupied_gpu()
     uvicorn.run(
         "server:app", host=args.host, port=args.port, reload=args.reload, workers=args.workers
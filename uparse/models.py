@@ -1,3 +1,5 @@
+import os
+from functools import partial
 from typing import Any
 
 import torch
@@ -11,12 +13,16 @@ from surya.model.recognition.processor import load_processor as load_recognition
 from surya.settings import settings
 from texify.model.model import load_model as load_texify_model
 from texify.model.processor import load_processor as load_texify_processor
+from texify.settings import settings as texify_settings
 from transformers import TableTransformerForObjectDetection
 from typing_extensions import TypedDict
 
-from uparse.utils import grasp_one_gpu, print_uparse_text_art
+from uparse.utils import grasp_one_gpu, load_maybe_quantized, print_uparse_text_art
+from uparse.utils.quantize import checkpoint_revision
 
+from .pipeline.chunking.transform import DEFAULT_TOKENIZER, load_tokenizer
 from .pipeline.pdf.marker.postprocessors.editor import load_editing_model
+from .pipeline.pdf.marker.settings import settings as marker_settings
 
 
 class Models(TypedDict, total=False):
@@ -32,6 +38,13 @@ class Models(TypedDict, total=False):
 
 g_models: Models = None
 
+TABLE_MODEL_CHECKPOINT = "microsoft/table-structure-recognition-v1.1-all"
+WHISPER_MODEL_NAME = "small"
+# whisper's own default, given explicitly to know where the checkpoint file is
+WHISPER_DOWNLOAD_ROOT = os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "whisper"
+)
+
 
 def get_device():
     if torch.cuda.is_available():
@@ -39,7 +52,7 @@ def get_device():
     return torch.device("mps") if torch.backends.mps.is_available() else torch.device("cpu")
 
 
-def load_models(dtype: torch.dtype = torch.float32) -> Models:
+def load_models(dtype: torch.dtype = torch.float32, quantize: bool | None = None) -> Models:
     global g_models
 
     if g_models is not None:
@@ -47,22 +60,57 @@ def load_models(dtype: torch.dtype = torch.float32) -> Models:
 
     print_uparse_text_art()
     device = get_device()
-    print(f"[LOG] ✅ Loading Models on {device}")
+    if quantize is None:
+        quantize = marker_settings.QUANTIZE_CPU_MODELS
+    quantize = quantize and device.type == "cpu"
+    if quantize:
+        dtype = torch.float32
+
+    def _load(name, load_fn, revision, extra_linear_types=()):
+        return load_maybe_quantized(
+            name,
+            load_fn,
+            quantize=quantize,
+            cache_dir=marker_settings.QUANTIZED_MODEL_CACHE_DIR,
+            revision=revision,
+            extra_linear_types=extra_linear_types,
+        )
+
+    print(f"[LOG] ✅ Loading Models on {device}{' (int8 quantized)' if quantize else ''}")
     print("[LOG] ✅ Loading Surya Model")
     g_models = {}
-    texify_model = load_texify_model(device=device, dtype=dtype)
+    texify_model = _load(
+        f"texify-{marker_settings.TEXIFY_MODEL_NAME}",
+        lambda: load_texify_model(device=device, dtype=dtype),
+        partial(checkpoint_revision, texify_settings.MODEL_CHECKPOINT),
+    )
     texify_model.processor = load_texify_processor()
     layout_model = load_detection_model(
         checkpoint=settings.LAYOUT_MODEL_CHECKPOINT, device=device, dtype=dtype
     )
     layout_model.processor = load_detection_processor(checkpoint=settings.LAYOUT_MODEL_CHECKPOINT)
-    order_model = load_order_model(device=device, dtype=dtype)
+    order_model = _load(
+        f"order-{settings.ORDER_MODEL_CHECKPOINT}",
+        lambda: load_order_model(device=device, dtype=dtype),
+        partial(checkpoint_revision, settings.ORDER_MODEL_CHECKPOINT),
+    )
     order_model.processor = load_order_processor()
-    ocr_model = load_recognition_model(device=device, dtype=dtype)
+    ocr_model = _load(
+        f"recognition-{settings.RECOGNITION_MODEL_CHECKPOINT}",
+        lambda: load_recognition_model(device=device, dtype=dtype),
+        partial(checkpoint_revision, settings.RECOGNITION_MODEL_CHECKPOINT),
+    )
     ocr_model.processor = load_recognition_processor()
     det_model = load_detection_model(device=device, dtype=dtype)
     det_model.processor = load_detection_processor()
-    edit_model = load_editing_model(device=device, dtype=dtype)
+    # checked before the quantized cache, which would serve a disabled editor otherwise
+    edit_model = None
+    if marker_settings.ENABLE_EDITOR_MODEL:
+        edit_model = _load(
+            f"editor-{marker_settings.EDITOR_MODEL_NAME}",
+            lambda: load_editing_model(device=device, dtype=dtype),
+            partial(checkpoint_revision, marker_settings.EDITOR_MODEL_NAME),
+        )
 
     g_models["texify_model"] = texify_model
     g_models["layout_model"] = layout_model
@@ -71,11 +119,27 @@ def load_models(dtype: torch.dtype = torch.float32) -> Models:
     g_models["det_model"] = det_model
     g_models["ocr_model"] = ocr_model
     print("[LOG] ✅ Loading Table Model")
-    g_models["table_model"] = TableTransformerForObjectDetection.from_pretrained(
-        "microsoft/table-structure-recognition-v1.1-all"
-    ).to(device)
+    g_models["table_model"] = _load(
+        TABLE_MODEL_CHECKPOINT,
+        lambda: TableTransformerForObjectDetection.from_pretrained(TABLE_MODEL_CHECKPOINT).to(
+            device
+        ),
+        partial(checkpoint_revision, TABLE_MODEL_CHECKPOINT),
+    )
     print("[LOG] ✅ Loading Audio Model")
-    g_models["whisper_model"] = whisper.load_model("small", device=device)
+    g_models["whisper_model"] = _load(
+        f"whisper-{WHISPER_MODEL_NAME}",
+        lambda: whisper.load_model(
+            WHISPER_MODEL_NAME, device=device, download_root=WHISPER_DOWNLOAD_ROOT
+        ),
+        partial(
+            checkpoint_revision, os.path.join(WHISPER_DOWNLOAD_ROOT, f"{WHISPER_MODEL_NAME}.pt")
+        ),
+        extra_linear_types=(whisper.model.Linear,),
+    )
+    print("[LOG] ✅ Loading Chunking Tokenizer")
+    # cached by name, requests with max_tokens use it without loading it themselves
+    load_tokenizer(DEFAULT_TOKENIZER)
     print("[LOG] ✅ All models loaded")
     return g_models
 
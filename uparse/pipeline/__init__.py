@@ -1,4 +1,5 @@
 from .callback import PerfTracker, PyTorchMemoryCleaner
+from .chunking import ChunkingTransform
 from .csv.pipeline import CSVPipeline
 from .docx.pipeline import WordPipeline
 from .excel.pipeline import ExcelPipeline
@@ -30,4 +31,5 @@ __all__ = [
     "VideoPipeline",
     "PDFVanillaPipeline",
     "TextPipeline",
+    "ChunkingTransform",
 ]
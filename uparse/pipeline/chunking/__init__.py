@@ -3,7 +3,7 @@ import string
 from abc import ABC, abstractmethod
 from collections import Counter
 
-from nltk.tokenize import sent_tokenize
+from .transform import ChunkingTransform, Rechunker
 
 
 # Define the abstract base class for chunking strategies
@@ -41,6 +41,8 @@ class NlpSentenceChunking(ChunkingStrategy):
         nltk.download("punkt")
 
     def chunk(self, text: str) -> list:
+        from nltk.tokenize import sent_tokenize
+
         sentences = sent_tokenize(text)
         sens = [sent.strip() for sent in sentences]
 
@@ -108,3 +110,15 @@ class SlidingWindowChunking(ChunkingStrategy):
         for i in range(0, len(words), self.step):
             chunks.append(" ".join(words[i : i + self.window_size]))
         return chunks
+
+
+__all__ = [
+    "ChunkingStrategy",
+    "RegexChunking",
+    "NlpSentenceChunking",
+    "TopicSegmentationChunking",
+    "FixedLengthWordChunking",
+    "SlidingWindowChunking",
+    "ChunkingTransform",
+    "Rechunker",
+]
@@ -0,0 +1,299 @@
+import bisect
+import functools
+import itertools
+import re
+from typing import Any, AsyncGenerator, Iterable, Iterator
+
+import anyio.to_thread
+
+from uparse.schema import Chunk, Document
+from uparse.schema.document import generate_id
+
+from ..pipeline import BaseTransform, State
+
+DEFAULT_TOKENIZER = "BAAI/bge-m3"
+CHUNK_SEPARATOR = "\n\n"
+
+# preferred places to cut an oversized chunk, best first
+BREAK_PATTERNS = [
+    re.compile(r"\n\s*\n"),
+    re.compile(r"\n"),
+    re.compile(r"(?<=[.!?;])\s|(?<=[。！？；])"),
+    re.compile(r"\s"),
+]
+
+# transcript segments keep their time span when merged
+SPAN_KEYS = ("start", "end")
+
+
+@functools.cache
+def load_tokenizer(name: str):
+    from transformers import AutoTokenizer
+
+    # fast (Rust) tokenizers encode a whole batch at once and report character offsets
+    return AutoTokenizer.from_pretrained(name, use_fast=True)
+
+
+def find_break(text: str, start: int, end: int, min_end: int) -> int:
+    """The best place to cut `text[start:end]`, no earlier than `min_end`."""
+    for pattern in BREAK_PATTERNS:
+        cut = None
+        for match in pattern.finditer(text, min_end, end):
+            cut = match.end()
+        if cut is not None and cut > start:
+            return cut
+    return end
+
+
+def split_text(text: str, offsets: list[tuple[int, int]], max_tokens: int) -> list[str]:
+    """Cut a text into pieces of at most `max_tokens` tokens, at natural breaks if possible.
+
+    `offsets` are the character spans of the tokens of `text`, as fast tokenizers report
+    them, so the text is not tokenized again.
+    """
+    starts = [start for start, _ in offsets]
+    pieces = []
+    token, char = 0, 0
+    while token < len(offsets):
+        last = min(token + max_tokens, len(offsets))
+        if last == len(offsets):
+            cut = len(text)
+        else:
+            # never cut in the first half of the window, pieces would get too small
+            half = offsets[token + max_tokens // 2][0]
+            cut = find_break(text, char, offsets[last][0], half)
+        piece = text[char:cut].strip()
+        if piece:
+            pieces.append(piece)
+        token = max(bisect.bisect_left(starts, cut), token + 1)
+        char = cut
+    return pieces
+
+
+def _batched(iterable: Iterable, n: int) -> Iterator[list]:
+    it = iter(iterable)
+    while batch := list(itertools.islice(it, n)):
+        yield batch
+
+
+def _without_span(metadata: dict | None) -> dict:
+    return {k: v for k, v in (metadata or {}).items() if k not in SPAN_KEYS}
+
+
+class Rechunker:
+    """Split and merge a stream of chunks to a token budget, one batch at a time.
+
+    Chunks that end up unchanged keep their token count from the first pass; split and
+    merged ones are counted again, together, so every `num_tokens` is exact.
+    """
+
+    def __init__(self, transform: "ChunkingTransform"):
+        self.transform = transform
+        self.buffer: list[Chunk] = []
+        self.index = 0
+
+    def _mergeable(self, a: Chunk, b: Chunk) -> bool:
+        return (
+            a.chunk_type == b.chunk_type
+            and a.parent_chunk_id == b.parent_chunk_id
+            and _without_span(a.metadata) == _without_span(b.metadata)
+        )
+
+    def _merge(self, chunks: list[Chunk]) -> Chunk:
+        if len(chunks) == 1:
+            return chunks[0]
+        first, last = chunks[0], chunks[-1]
+        metadata = dict(first.metadata) if first.metadata is not None else None
+        if metadata is not None and last.metadata and "end" in last.metadata:
+            metadata["end"] = last.metadata["end"]
+        return first.model_copy(
+            update={
+                "content": CHUNK_SEPARATOR.join(c.content for c in chunks),
+                "metadata": metadata,
+                "num_tokens": None,
+            }
+        )
+
+    def _buffered_tokens(self) -> int:
+        # one extra token per chunk for the separators
+        return sum(c.num_tokens + 1 for c in self.buffer)
+
+    def _flush(self, out: list[Chunk]):
+        if self.buffer:
+            out.append(self._merge(self.buffer))
+            self.buffer = []
+
+    def _push(self, chunk: Chunk, out: list[Chunk]):
+        max_tokens, min_tokens = self.transform.max_tokens, self.transform.min_tokens
+        if self.buffer and (
+            not self._mergeable(self.buffer[0], chunk)
+            or self._buffered_tokens() + chunk.num_tokens > max_tokens
+        ):
+            self._flush(out)
+        if not self.buffer and chunk.num_tokens >= min_tokens:
+            out.append(chunk)
+            return
+        self.buffer.append(chunk)
+        if self._buffered_tokens() >= min_tokens:
+            self._flush(out)
+
+    def _split(self, chunk: Chunk, offsets) -> list[Chunk]:
+        pieces = split_text(chunk.content, offsets, self.transform.max_tokens)
+        return [
+            chunk.model_copy(
+                update={
+                    "id": chunk.id if i == 0 else generate_id(),
+                    "content": piece,
+                    "metadata": dict(chunk.metadata) if chunk.metadata is not None else None,
+                    "num_tokens": None,
+                }
+            )
+            for i, piece in enumerate(pieces)
+        ]
+
+    def _finish(self, out: list[Chunk]) -> list[Chunk]:
+        self.transform.count([c for c in out if c.num_tokens is None])
+        for chunk in out:
+            chunk.index = self.index
+            self.index += 1
+        return out
+
+    def push(self, chunks: list[Chunk]) -> list[Chunk]:
+        """Take the next chunks, returns the chunks that are final so far."""
+        out = []
+        offsets = self.transform.count(chunks)
+        for chunk, chunk_offsets in zip(chunks, offsets):
+            if chunk.children:
+                # sections keep their place, their own children are fitted separately
+                chunk.children = list(self.transform.iter_chunks(chunk.children))
+                chunk.child_chunk_ids = [child.id for child in chunk.children]
+            if (
+                chunk.chunk_type not in self.transform.chunk_types
+                or chunk.children
+                or not chunk.content
+            ):
+                self._flush(out)
+                out.append(chunk)
+                continue
+            if chunk.num_tokens > self.transform.max_tokens:
+                pieces = self._split(chunk, chunk_offsets)
+                # split pieces are counted right away, merging needs their size
+                self.transform.count(pieces)
+            else:
+                pieces = [chunk]
+            for piece in pieces:
+                self._push(piece, out)
+        return self._finish(out)
+
+    def flush(self) -> list[Chunk]:
+        """The chunks still held back for merging, at the end of the stream."""
+        out = []
+        self._flush(out)
+        return self._finish(out)
+
+
+class ChunkingTransform(BaseTransform[State]):
+    """Fit the chunks of a document to a token budget and fill in their `num_tokens`.
+
+    Chunks of `chunk_types` longer than `max_tokens` are split at paragraph, line, sentence
+    or word breaks. Consecutive ones shorter than `min_tokens` are merged while they fit,
+    when they have the same type, parent and metadata. Other chunks are only counted, and
+    the children of a chunk are fitted the same way, among themselves.
+
+    Append it to any pipeline, `pipeline | ChunkingTransform(max_tokens=512)`. Streamed, it
+    re-chunks as the pipeline produces chunks instead of waiting for the whole document.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 512,
+        min_tokens: int = 64,
+        chunk_types: Iterable[str] = ("text", "markdown"),
+        tokenizer: str | Any = DEFAULT_TOKENIZER,
+        batch_size: int = 256,
+        *args,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        if not 0 <= min_tokens <= max_tokens:
+            raise ValueError(f"Invalid token budget: min {min_tokens}, max {max_tokens}")
+        self.max_tokens = max_tokens
+        self.min_tokens = min_tokens
+        self.chunk_types = set(chunk_types)
+        self._tokenizer = tokenizer
+        self.batch_size = batch_size
+
+    @property
+    def tokenizer(self):
+        if isinstance(self._tokenizer, str):
+            self._tokenizer = load_tokenizer(self._tokenizer)
+        return self._tokenizer
+
+    def count(self, chunks: list[Chunk]) -> list[list[tuple[int, int]]]:
+        """Fill in `num_tokens` with one batched tokenizer call, returns the token offsets."""
+        if not chunks:
+            return []
+        encoded = self.tokenizer(
+            [chunk.content or "" for chunk in chunks],
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            verbose=False,
+        )
+        for chunk, ids in zip(chunks, encoded["input_ids"]):
+            chunk.num_tokens = len(ids)
+        return encoded["offset_mapping"]
+
+    def rechunker(self) -> Rechunker:
+        return Rechunker(self)
+
+    def iter_chunks(self, chunks: Iterable[Chunk]) -> Iterator[Chunk]:
+        """Yield the re-chunked chunks, reading and tokenizing `batch_size` at a time."""
+        rechunker = self.rechunker()
+        for batch in _batched(chunks, self.batch_size):
+            yield from rechunker.push(batch)
+        yield from rechunker.flush()
+
+    @staticmethod
+    def _replace_chunks(doc: Document, chunks: list[Chunk]):
+        doc.chunks = []
+        doc.child_chunk_ids = None
+        doc.add_chunk(chunks)
+
+    async def transform(self, state, **kwargs):
+        doc = state.get("doc")
+        if doc is None:
+            return state
+        chunks = await anyio.to_thread.run_sync(lambda: list(self.iter_chunks(doc.chunks)))
+        self._replace_chunks(doc, chunks)
+        return state
+
+    async def stream_from(
+        self, upstream: AsyncGenerator[State, None] | None, state: State, *args
+    ) -> AsyncGenerator[State, None]:
+        if upstream is None:
+            async for s in super().stream_from(upstream, state, *args):
+                yield s
+            return
+
+        await self._init()
+        listener = self.shared.listener
+        await getattr(listener, self._enter_callback)(self, state)
+        rechunker = self.rechunker()
+        done = 0
+        async for s in upstream:
+            doc = s.get("doc")
+            if doc is not None and len(doc.chunks) > done:
+                # swap the raw chunks the upstream just added for the final ones
+                new_chunks = doc.chunks[done:]
+                del doc.chunks[done:]
+                if doc.child_chunk_ids is not None:
+                    del doc.child_chunk_ids[done:]
+                doc.add_chunk(await anyio.to_thread.run_sync(rechunker.push, new_chunks))
+                done = len(doc.chunks)
+            yield s
+        doc = state.get("doc")
+        if doc is not None:
+            doc.add_chunk(await anyio.to_thread.run_sync(rechunker.flush))
+        await getattr(listener, self._exit_callback)(self, state)
+        yield state
@@ -1,11 +1,12 @@
-import csv
+from typing import Iterator
 
+import anyio.to_thread
 import pandas as pd
 
 from uparse.schema import Chunk, Document
 
 from ..pipeline import BaseTransform, Pipeline, State
-from ..utils import detect_file_encodings
+from ..utils import iter_file_encodings
 
 
 class CSVState(State):
@@ -19,6 +20,7 @@ class ParseCSV(BaseTransform[CSVState]):
         autodetect_encoding: bool = True,
         source_column: str | None = None,
         csv_args: dict = {},
+        chunksize: int = 100_000,
         *args,
         **kwargs,
     ):
@@ -27,51 +29,87 @@ class ParseCSV(BaseTransform[CSVState]):
         self.autodetect_encoding = autodetect_encoding
         self.source_column = source_column
         self.csv_args = csv_args
+        self.chunksize = chunksize
+
+    def _iter_batches(self, uri: str) -> Iterator[list[Chunk]]:
+        """Yield the chunks of the file one batch of rows at a time."""
+        error = None
+        done = 0
+        # detect up front from a bounded sample rather than after a failed full decode
+        for encoding in iter_file_encodings(uri, self.encoding, self.autodetect_encoding):
+            try:
+                with open(uri, newline="", encoding=encoding) as csvfile:
+                    rows = 0
+                    for df in self._read_batches(csvfile):
+                        # a later encoding re-reads the file, rows already read are kept
+                        skip = max(done - rows, 0)
+                        rows += len(df)
+                        if skip < len(df):
+                            yield self._build_chunks(df.iloc[skip:], self.source_column)
+                            done = rows
+                return
+            except UnicodeDecodeError as e:
+                error = e
+
+        raise RuntimeError(f"Error loading {uri}") from error
+
+    def _read_batches(self, csvfile) -> Iterator[pd.DataFrame]:
+        # read the csv file in batches of rows, never holding the whole file as one frame.
+        # cells are kept as text, dtypes inferred per batch would render them differently
+        csv_args = {"dtype": str, "keep_default_na": False, **self.csv_args}
+        with pd.read_csv(
+            csvfile, on_bad_lines="skip", chunksize=self.chunksize, **csv_args
+        ) as reader:
+            yield from reader
+
+    def _new_document(self) -> Document:
+        return Document(metadata={"csv_args": self.csv_args, "source_column": self.source_column})
 
     async def transform(self, state, **kwargs):
-        uri = state["uri"]
-        try:
-            with open(uri, newline="", encoding=self.encoding) as csvfile:
-                state["doc"] = self._read_from_file(csvfile, self.csv_args, self.source_column)
-        except UnicodeDecodeError as e:
-            if self.autodetect_encoding:
-                detected_encodings = detect_file_encodings(uri)
-                for encoding in detected_encodings:
-                    try:
-                        with open(uri, newline="", encoding=encoding.encoding) as csvfile:
-                            state["doc"] = self._read_from_file(
-                                csvfile, self.csv_args, self.source_column
-                            )
-                        break
-                    except UnicodeDecodeError:
-                        continue
-            else:
-                raise RuntimeError(f"Error loading {uri}") from e
-
-        return state
-
-    def _read_from_file(self, csvfile, csv_args, source_column) -> Document:
-        doc = Document(metadata={"csv_args": csv_args, "source_column": source_column})
-        try:
-            # load csv file into pandas dataframe
-            df = pd.read_csv(csvfile, on_bad_lines="skip", **csv_args)
-
-            # check source column exists
-            if source_column and source_column not in df.columns:
-                raise ValueError(f"Source column '{source_column}' not found in CSV file.")
-
-            # create document objects
-            chunks = []
-            for i, row in df.iterrows():
-                content = ";".join(f"{col.strip()}: {str(row[col]).strip()}" for col in df.columns)
-                source = row[source_column] if source_column else ""
-                metadata = {"source": source, "row": i}
-                chunks.append(Chunk(content=content, metadata=metadata, index=i))
+        doc = self._new_document()
+        for chunks in await anyio.to_thread.run_sync(
+            lambda: list(self._iter_batches(state["uri"]))
+        ):
             doc.add_chunk(chunks)
-        except csv.Error as e:
-            raise e
+        state["doc"] = doc
+        return state
 
-        return doc
+    async def stream_transform(self, state, **kwargs):
+        """Yield the state every time a batch of rows is added as chunks.
+
+        Batches are read in a worker thread, the event loop delivers the chunks meanwhile.
+        """
+        state["doc"] = self._new_document()
+        batches = self._iter_batches(state["uri"])
+        while True:
+            chunks = await anyio.to_thread.run_sync(next, batches, None)
+            if chunks is None:
+                break
+            state["doc"].add_chunk(chunks)
+            yield state
+        if not state["doc"].chunks:
+            # an empty file still ends with its document
+            yield state
+
+    @staticmethod
+    def _build_chunks(df: pd.DataFrame, source_column: str | None) -> list[Chunk]:
+        # check source column exists
+        if source_column and source_column not in df.columns:
+            raise ValueError(f"Source column '{source_column}' not found in CSV file.")
+
+        # build "col: value;col: value" for all rows at once, column by column
+        contents = None
+        for col in df.columns:
+            part = f"{str(col).strip()}: " + df[col].astype(str).str.strip()
+            contents = part if contents is None else contents + ";" + part
+        contents = contents.tolist() if contents is not None else [""] * len(df)
+        sources = df[source_column].tolist() if source_column else [""] * len(df)
+
+        # create document objects
+        return [
+            Chunk(content=content, metadata={"source": source, "row": i}, index=i)
+            for i, content, source in zip(df.index.tolist(), contents, sources)
+        ]
 
 
 class CSVPipeline(Pipeline):
@@ -83,6 +121,7 @@ class CSVPipeline(Pipeline):
         autodetect_encoding: bool = True,
         source_column: str | None = None,
         csv_args: dict = {},
+        chunksize: int = 100_000,
         *args,
         **kwargs,
     ):
@@ -93,6 +132,7 @@ class CSVPipeline(Pipeline):
                     autodetect_encoding=autodetect_encoding,
                     source_column=source_column,
                     csv_args=csv_args,
+                    chunksize=chunksize,
                 )
             ],
             *args,
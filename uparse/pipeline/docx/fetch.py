@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import json
+import pathlib
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+import anyio
+import httpx
+from loguru import logger
+
+from uparse.storage import get_storage
+
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_MAX_PER_HOST = 4
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+
+
+class FetchedImage(NamedTuple):
+    content: bytes
+    content_type: str
+
+
+class ImageFetcher:
+    """Fetch remote images concurrently over one shared connection pool.
+
+    Connections are bounded overall and per host, every request has a timeout and a size
+    cap, and responses carrying an ETag are cached on disk. Cached entries are revalidated
+    with `If-None-Match`, so an unchanged image costs one 304 instead of a download.
+
+    Pass `transport` (e.g. `httpx.MockTransport`) to run against a local stand-in.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | pathlib.Path | None = None,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_per_host: int = DEFAULT_MAX_PER_HOST,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        if cache_dir is None:
+            cache_dir = get_storage().output_dir / ".cache" / "remote_images"
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._host_limits: dict[str, asyncio.Semaphore] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # the pool and the semaphores belong to one event loop, rebuild them on a new one
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=httpx.Timeout(self.timeout),
+                follow_redirects=True,
+                transport=self.transport,
+            )
+            self._loop = loop
+            self._host_limits = {}
+        return self._client
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_limits[host]
+
+    def _cache_key(self, url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _read_cache(self, url: str) -> tuple[dict, bytes] | None:
+        key = self._cache_key(url)
+        try:
+            meta = json.loads((self.cache_dir / f"{key}.json").read_text())
+            return meta, (self.cache_dir / f"{key}.bin").read_bytes()
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, url: str, etag: str, image: FetchedImage):
+        # one blob per url, a new etag overwrites it; replace() keeps readers off partial files
+        key = self._cache_key(url)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        meta = {"url": url, "etag": etag, "content_type": image.content_type}
+        for name, data in (
+            (f"{key}.bin", image.content),
+            (f"{key}.json", json.dumps(meta).encode("utf-8")),
+        ):
+            tmp_path = self.cache_dir / f"{name}.{id(image):x}.tmp"
+            tmp_path.write_bytes(data)
+            tmp_path.replace(self.cache_dir / name)
+
+    async def fetch(self, url: str) -> FetchedImage | None:
+        """Fetch one image, returning None when it cannot be fetched within the limits."""
+        cached = await anyio.to_thread.run_sync(self._read_cache, url)
+        headers = {"If-None-Match": cached[0]["etag"]} if cached else {}
+        client = self._get_client()
+        try:
+            async with self._host_limit(url):
+                async with client.stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304 and cached:
+                        return FetchedImage(cached[1], cached[0]["content_type"])
+                    if response.status_code != 200:
+                        logger.warning(f"Fetching image {url} failed: HTTP {response.status_code}")
+                        return None
+                    if int(response.headers.get("Content-Length") or 0) > self.max_bytes:
+                        logger.warning(f"Image {url} is larger than {self.max_bytes} bytes")
+                        return None
+                    content = bytearray()
+                    async for data in response.aiter_bytes():
+                        content += data
+                        if len(content) > self.max_bytes:
+                            logger.warning(f"Image {url} is larger than {self.max_bytes} bytes")
+                            return None
+                    content_type = response.headers.get("Content-Type", "")
+                    etag = response.headers.get("ETag")
+        except httpx.HTTPError as e:
+            logger.warning(f"Fetching image {url} failed: {e!r}")
+            return None
+
+        image = FetchedImage(bytes(content), content_type.split(";")[0].strip())
+        if etag:
+            try:
+                await anyio.to_thread.run_sync(self._write_cache, url, etag, image)
+            except OSError as e:
+                logger.warning(f"Caching image {url} failed: {e!r}")
+        return image
+
+    async def fetch_all(self, urls: list[str]) -> dict[str, FetchedImage | None]:
+        urls = list(dict.fromkeys(urls))
+        images = await asyncio.gather(*[self.fetch(url) for url in urls])
+        return dict(zip(urls, images))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+image_fetcher: ImageFetcher = None
+
+
+def get_image_fetcher() -> ImageFetcher:
+    global image_fetcher
+    if not image_fetcher:
+        image_fetcher = ImageFetcher()
+    return image_fetcher
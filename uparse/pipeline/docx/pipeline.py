@@ -1,19 +1,40 @@
+import hashlib
 import mimetypes
 import pathlib
 import re
 import uuid
-import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
 from docx import Document as DocxDocument
 from docx.document import Document as DocumentObject
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.hyperlink import Hyperlink
+from docx.text.paragraph import Paragraph
 from loguru import logger
 
 from uparse.schema import Chunk, Document
 from uparse.storage import get_storage
-from uparse.utils import convert_to, csv_dumps, encode_image_to_base64
+from uparse.utils import convert_to, csv_dumps, encode_image_bytes
+from uparse.utils.image import MAX_IMAGE_SIZE
 
 from ..pipeline import BaseTransform, Pipeline, State
+from .fetch import FetchedImage, get_image_fetcher
+
+W_P = qn("w:p")
+W_TBL = qn("w:tbl")
+W_R = qn("w:r")
+W_HYPERLINK = qn("w:hyperlink")
+# run children that contribute to `Run.text`
+RUN_TEXT_TAGS = tuple(
+    qn(tag) for tag in ("w:br", "w:cr", "w:noBreakHyphen", "w:ptab", "w:t", "w:tab")
+)
+W_INSTR_TEXT = qn("w:instrText")
+A_BLIP = qn("a:blip")
+R_EMBED = qn("r:embed")
+R_LINK = qn("r:link")
+URL_PATTERN = re.compile(r"https?://[^\s\"]+")
 
 
 class WordState(State):
@@ -21,82 +42,130 @@ class WordState(State):
 
 
 class ParseWord(BaseTransform[WordState]):
-    def __init__(self, output_dir: str = "outputs", *args, **kwargs):
+    def __init__(
+        self,
+        output_dir: str = "outputs",
+        max_image_size: int = MAX_IMAGE_SIZE,
+        max_workers: int | None = None,
+        *args,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.output_dir = output_dir
+        self.max_image_size = max_image_size
+        self.max_workers = max_workers
 
     async def transform(self, state, **kwargs):
         uri = state["uri"]
-        if self.uri.endswith(".doc"):
-            self.uri = convert_to(self.uri, format="docx")
-        self.output_dir = pathlib.Path(self.output_dir) / pathlib.Path(self.uri).stem
-        doc = self.parse_docx(uri)
+        if uri.endswith(".doc"):
+            uri = convert_to(uri, format="docx")
+        output_dir = pathlib.Path(self.output_dir) / pathlib.Path(uri).stem
+        docx = DocxDocument(uri)
+        # linked images are fetched concurrently up front, the parse itself stays sync
+        external_urls = [rel.target_ref for rel in self._iter_image_rels(docx) if rel.is_external]
+        external_images = await get_image_fetcher().fetch_all(external_urls)
+        doc = self.parse_docx(docx, output_dir, external_images)
         state["doc"] = doc
         return state
 
-    def _extract_images_from_docx(self, doc: DocumentObject):
-        image_dir = self.output_dir / "images"
+    @staticmethod
+    def _iter_image_rels(doc: DocumentObject):
+        for rel in doc.part.rels.values():
+            if rel.is_external:
+                if rel.reltype == RT.IMAGE:
+                    yield rel
+            elif "image" in rel.target_ref:
+                yield rel
+
+    def _store_image(self, file_key: pathlib.Path, blob: bytes) -> str:
+        storage = get_storage()
+        storage.save(file_key, blob)
+        return storage.save_blob(encode_image_bytes(blob, max_size=self.max_image_size))
+
+    def _extract_images_from_docx(
+        self,
+        doc: DocumentObject,
+        output_dir: pathlib.Path,
+        external_images: dict[str, FetchedImage | None] | None = None,
+    ):
+        image_dir = output_dir / "images"
         image_count = 0
-        image_map = {}
+        images = []
+        # identical blobs are stored and encoded once per document, keyed by content hash
+        stored = {}
 
-        for rel in doc.part.rels.values():
-            if "image" in rel.target_ref:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for rel in self._iter_image_rels(doc):
                 image_count += 1
                 if rel.is_external:
-                    url = rel.reltype
-                    response = requests.get(url, stream=True)
-                    if response.status_code == 200:
-                        image_ext = mimetypes.guess_extension(response.headers["Content-Type"])
-                        file_uuid = str(uuid.uuid4())
-                        file_key = image_dir / f"{file_uuid}.{image_ext}"
-                        get_storage().save(file_key, response.content)
-                    else:
+                    fetched = (external_images or {}).get(rel.target_ref)
+                    if fetched is None:
                         continue
+                    image_ext = mimetypes.guess_extension(fetched.content_type)
+                    image_ext = (image_ext or ".bin").lstrip(".")
+                    key, blob = rel.target_ref, fetched.content
                 else:
                     image_ext = rel.target_ref.split(".")[-1]
-                    # user uuid as file name
-                    file_uuid = str(uuid.uuid4())
-                    file_key = image_dir / f"{file_uuid}.{image_ext}"
-                    get_storage().save(file_key, rel.target_part.blob)
+                    key, blob = rel.target_part, rel.target_part.blob
 
-                image_map[rel.target_part] = {
-                    "text": f"![image_{image_count}](images/{file_uuid}.{image_ext})",
-                    "image_name": f"image_{image_count}",
-                    "image_data": encode_image_to_base64(file_key),
-                }
+                digest = hashlib.sha256(blob).hexdigest()
+                if digest not in stored:
+                    # user uuid as file name
+                    file_name = f"{uuid.uuid4()}.{image_ext}"
+                    future = executor.submit(self._store_image, image_dir / file_name, blob)
+                    stored[digest] = (file_name, future)
+                images.append((key, image_count, *stored[digest]))
 
+        image_map = {}
+        for key, count, file_name, future in images:
+            try:
+                image_key = future.result()
+            except OSError as e:
+                # formats PIL cannot read (EMF, WMF, ...) are kept as files only
+                logger.warning(f"Could not encode image {file_name}: {e}")
+                image_key = None
+            image_map[key] = {
+                "text": f"![image_{count}](images/{file_name})",
+                "image_name": f"image_{count}",
+                "image_key": image_key,
+            }
         return image_map
 
     def _table_to_markdown(self, table, image_map):
         markdown = []
         rows = []
+        # row.cells walks the layout grid, resolve it once per row
+        row_cells = [row.cells for row in table.rows]
         # calculate the total number of columns
-        total_cols = max(len(row.cells) for row in table.rows)
+        total_cols = max(len(cells) for cells in row_cells)
+        # spanned and vertically merged cells repeat the same <w:tc>, parse it once
+        cell_cache = {}
 
-        header_row = table.rows[0]
-        headers = self._parse_row(header_row, image_map, total_cols)
+        headers = self._parse_row(row_cells[0], image_map, total_cols, cell_cache)
         rows.append(headers)
         markdown.append("| " + " | ".join(headers) + " |")
         markdown.append("| " + " | ".join(["---"] * total_cols) + " |")
 
-        for row in table.rows[1:]:
-            row_cells = self._parse_row(row, image_map, total_cols)
-            markdown.append("| " + " | ".join(row_cells) + " |")
-            rows.append(row_cells)
+        for cells in row_cells[1:]:
+            parsed_cells = self._parse_row(cells, image_map, total_cols, cell_cache)
+            markdown.append("| " + " | ".join(parsed_cells) + " |")
+            rows.append(parsed_cells)
         return "\n".join(markdown), rows
 
-    def _parse_row(self, row, image_map, total_cols):
+    def _parse_row(self, cells, image_map, total_cols, cell_cache):
         # Initialize a row, all of which are empty by default
         row_cells = [""] * total_cols
         col_index = 0
-        for cell in row.cells:
+        for cell in cells:
             # make sure the col_index is not out of range
             while col_index < total_cols and row_cells[col_index] != "":
                 col_index += 1
             # if col_index is out of range the loop is jumped
             if col_index >= total_cols:
                 break
-            cell_content = self._parse_cell(cell, image_map).strip()
+            if cell._tc not in cell_cache:
+                cell_cache[cell._tc] = self._parse_cell(cell, image_map).strip()
+            cell_content = cell_cache[cell._tc]
             cell_colspan = cell.grid_span if cell.grid_span else 1
             for i in range(cell_colspan):
                 if col_index + i < total_cols:
@@ -115,136 +184,127 @@ class ParseWord(BaseTransform[WordState]):
 
     def _parse_cell_paragraph(self, paragraph, image_map):
         paragraph_content = []
-        for run in paragraph.runs:
-            if run.element.xpath(".//a:blip"):
-                for blip in run.element.xpath(".//a:blip"):
-                    image_id = blip.get(
-                        "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed"
-                    )
-                    image_part = paragraph.part.rels[image_id].target_part
-
-                    if image_part in image_map:
-                        image_link = image_map[image_part]["text"]
-                        paragraph_content.append(image_link)
+        for run in paragraph._p.iterchildren(W_R):
+            blips = list(run.iter(A_BLIP))
+            if blips:
+                for blip in blips:
+                    image_info = self._blip_image(blip, paragraph.part, image_map)
+                    if image_info:
+                        paragraph_content.append(image_info["text"])
             else:
-                paragraph_content.append(run.text)
+                paragraph_content.append(self._run_text(run))
         content = "".join(paragraph_content).strip()
         content = content.replace("\n", "<br>")
         return content
 
-    def _parse_paragraph(self, paragraph, image_map):
-        paragraph_content = []
-        for run in paragraph.runs:
-            if run.element.xpath(".//a:blip"):
-                for blip in run.element.xpath(".//a:blip"):
-                    embed_id = blip.get(
-                        "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed"
-                    )
-                    if embed_id:
-                        rel_target = run.part.rels[embed_id].target_ref
-                        if rel_target in image_map:
-                            paragraph_content.append(image_map[rel_target]["text"])
-            if run.text.strip():
-                paragraph_content.append(run.text.strip())
-        return " ".join(paragraph_content) if paragraph_content else ""
-
-    def parse_docx(self, docx_path):
-        doc = DocxDocument(docx_path)
+    @staticmethod
+    def _blip_image(blip, part, image_map) -> dict | None:
+        # embedded images are keyed by their part, linked (external) ones by their url
+        embed_id = blip.get(R_EMBED)
+        if embed_id:
+            return image_map.get(part.related_parts.get(embed_id))
+        link_id = blip.get(R_LINK)
+        if link_id and link_id in part.rels:
+            return image_map.get(part.rels[link_id].target_ref)
+        return None
 
-        content = []
+    @staticmethod
+    def _run_text(run_element) -> str:
+        # same as `Run.text`, without python-docx compiling an XPath for every run
+        return "".join(str(child) for child in run_element.iterchildren(*RUN_TEXT_TAGS))
 
-        image_map = self._extract_images_from_docx(doc)
-
-        hyperlinks_url = None
-        url_pattern = re.compile(r"http://[^\s+]+//|https://[^\s+]+")
-        for para in doc.paragraphs:
-            for run in para.runs:
-                if run.text and hyperlinks_url:
-                    result = f"  [{run.text}]({hyperlinks_url})  "
-                    run.text = result
-                    hyperlinks_url = None
-                if "HYPERLINK" in run.element.xml:
-                    try:
-                        xml = ET.XML(run.element.xml)
-                        x_child = [c for c in xml.iter() if c is not None]
-                        for x in x_child:
-                            if x_child is None:
-                                continue
-                            if x.tag.endswith("instrText"):
-                                for i in url_pattern.findall(x.text):
-                                    hyperlinks_url = str(i)
-                    except Exception as e:
-                        logger.error(e)
-
-        def parse_paragraph(paragraph):
-            paragraph_content = []
-            chunks = []
-            chunk_content = ""
-            for run in paragraph.runs:
-                if (
-                    hasattr(run.element, "tag")
-                    and isinstance(element.tag, str)
-                    and run.element.tag.endswith("r")
-                ):
-                    drawing_elements = run.element.findall(
-                        ".//{http://schemas.openxmlformats.org/wordprocessingml/2006/main}drawing"
-                    )
-                    for drawing in drawing_elements:
-                        blip_elements = drawing.findall(
-                            ".//{http://schemas.openxmlformats.org/drawingml/2006/main}blip"
-                        )
-                        for blip in blip_elements:
-                            embed_id = blip.get(
-                                "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed"
-                            )
-                            if embed_id:
-                                image_part = doc.part.related_parts.get(embed_id)
-                                if image_part in image_map:
-                                    image_info = image_map[image_part]
-                                    paragraph_content.append(image_info["text"])
-                                    if chunk_content:
-                                        chunks.append(Chunk(content=chunk_content))
-                                        chunk_content = ""
-                                    chunks.append(
-                                        Chunk(
-                                            content=image_info["text"],
-                                            chunk_type="image",
-                                            image_name=image_info["image_name"],
-                                            image_content=image_info["image_data"],
-                                        )
-                                    )
-                if run.text.strip():
-                    paragraph_content.append(run.text.strip())
-                    chunk_content += run.text.strip()
-            if chunk_content:
-                chunks.append(Chunk(content=chunk_content))
-            return "".join(paragraph_content) if paragraph_content else "", chunks
-
-        paragraphs = doc.paragraphs.copy()
-        tables = doc.tables.copy()
+    @staticmethod
+    def _field_hyperlink(run_element) -> str | None:
+        # target of a HYPERLINK field code, e.g. <w:instrText> HYPERLINK "https://..." </w:instrText>
+        url = None
+        for instr in run_element.iter(W_INSTR_TEXT):
+            if instr.text and "HYPERLINK" in instr.text:
+                for match in URL_PATTERN.findall(instr.text):
+                    url = match
+        return url
+
+    def _parse_paragraph(self, paragraph, image_map, hyperlink_url=None):
+        """Parse one body paragraph in a single pass over its runs and hyperlinks.
+
+        `hyperlink_url` is a pending HYPERLINK field target, it applies to the next run with
+        text even across paragraphs, so the updated value is returned along with the text
+        and chunks.
+        """
+        paragraph_content = []
         chunks = []
-        for element in doc.element.body:
-            if hasattr(element, "tag"):
-                if isinstance(element.tag, str) and element.tag.endswith("p"):  # paragraph
-                    para = paragraphs.pop(0)
-                    parsed_paragraph, p_chunks = parse_paragraph(para)
-                    if parsed_paragraph:
-                        content.append(parsed_paragraph)
-                        chunks.extend(p_chunks)
-                elif isinstance(element.tag, str) and element.tag.endswith("tbl"):  # table
-                    table = tables.pop(0)
-                    markdown, rows = self._table_to_markdown(table, image_map)
-                    content.append(markdown)
-                    chunks.append(
-                        Chunk(
-                            content=markdown, chunk_type="table_csv", table_content=csv_dumps(rows)
+        chunk_content = ""
+        for item in paragraph._p.iterchildren(W_R, W_HYPERLINK):
+            if item.tag == W_HYPERLINK:
+                runs = list(item.iterchildren(W_R))
+                text = "".join(self._run_text(run) for run in runs)
+                url = Hyperlink(item, paragraph).url
+                if text.strip() and url:
+                    text = f"[{text}]({url})"
+            else:
+                runs = [item]
+                text = self._run_text(item)
+                if text and hyperlink_url:
+                    text = f"[{text}]({hyperlink_url})"
+                    hyperlink_url = None
+                hyperlink_url = self._field_hyperlink(item) or hyperlink_url
+
+            for run in runs:
+                for blip in run.iter(A_BLIP):
+                    image_info = self._blip_image(blip, paragraph.part, image_map)
+                    if image_info:
+                        paragraph_content.append(image_info["text"])
+                        if chunk_content:
+                            chunks.append(Chunk(content=chunk_content))
+                            chunk_content = ""
+                        chunks.append(
+                            Chunk(
+                                content=image_info["text"],
+                                chunk_type="image",
+                                image_name=image_info["image_name"],
+                                image_key=image_info["image_key"],
+                            )
                         )
-                    )
+            if text.strip():
+                paragraph_content.append(text.strip())
+                chunk_content += text.strip()
+        if chunk_content:
+            chunks.append(Chunk(content=chunk_content))
+        return "".join(paragraph_content), chunks, hyperlink_url
+
+    def parse_docx(
+        self,
+        docx: str | DocumentObject,
+        output_dir: pathlib.Path,
+        external_images: dict[str, FetchedImage | None] | None = None,
+    ):
+        doc = DocxDocument(docx) if isinstance(docx, str) else docx
+        image_map = self._extract_images_from_docx(doc, output_dir, external_images)
+
+        content = []
+        chunks = []
+        num_tables = 0
+        hyperlink_url = None
+        # one pass over the body, wrapping each element in its python-docx object as we go
+        for element in doc.element.body.iterchildren(W_P, W_TBL):
+            if element.tag == W_P:
+                parsed_paragraph, p_chunks, hyperlink_url = self._parse_paragraph(
+                    Paragraph(element, doc._body), image_map, hyperlink_url
+                )
+                if parsed_paragraph:
+                    content.append(parsed_paragraph)
+                    chunks.extend(p_chunks)
+            else:
+                num_tables += 1
+                markdown, rows = self._table_to_markdown(Table(element, doc._body), image_map)
+                content.append(markdown)
+                chunks.append(
+                    Chunk(content=markdown, chunk_type="table_csv", table_content=csv_dumps(rows))
+                )
         ret = Document(
             summary="\n".join(content),
             metadata={
                 "num_paragraphs": len(content),
-                "num_tables": len(tables),
+                "num_tables": num_tables,
                 "num_images": len(image_map),
             },
         )
@@ -255,5 +315,20 @@ class ParseWord(BaseTransform[WordState]):
 class WordPipeline(Pipeline):
     allowed_extensions = [".docx", ".doc"]
 
-    def __init__(self, output_dir: str = "outputs", *args, **kwargs):
-        super().__init__(transforms=[ParseWord(output_dir=output_dir)], *args, **kwargs)
+    def __init__(
+        self,
+        output_dir: str = "outputs",
+        max_image_size: int = MAX_IMAGE_SIZE,
+        max_workers: int | None = None,
+        *args,
+        **kwargs,
+    ):
+        super().__init__(
+            transforms=[
+                ParseWord(
+                    output_dir=output_dir, max_image_size=max_image_size, max_workers=max_workers
+                )
+            ],
+            *args,
+            **kwargs,
+        )
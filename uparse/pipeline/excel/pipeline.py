@@ -1,58 +1,177 @@
+import asyncio
 import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree.ElementTree import fromstring, iterparse
 
 import pandas as pd
 from openpyxl import load_workbook
+from openpyxl.packaging.relationship import get_dependents, get_rels_path
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.xml.constants import ARC_ROOT_RELS, ARC_WORKBOOK, REL_NS, SHEET_MAIN_NS
 
 from uparse.schema import Chunk, Document
 
 from ..pipeline import BaseTransform, Pipeline, State
 
+HYPERLINK_TAG = f"{{{SHEET_MAIN_NS}}}hyperlink"
+ROW_TAG = f"{{{SHEET_MAIN_NS}}}row"
+SHEET_TAG = f"{{{SHEET_MAIN_NS}}}sheet"
+OFFICE_DOCUMENT_REL_SUFFIX = "/officeDocument"
+REL_ID_ATTR = f"{{{REL_NS}}}id"
+
 
 class ExcelState(State):
     pass
 
 
+class HyperlinkMap:
+    """Hyperlink targets of one sheet, looked up by 1-based (row, column)."""
+
+    def __init__(self):
+        self.cells: dict[tuple[int, int], str] = {}
+        self.ranges: list[tuple[int, int, int, int, str]] = []
+
+    def add(self, ref: str, target: str):
+        min_col, min_row, max_col, max_row = range_boundaries(ref)
+        if min_col == max_col and min_row == max_row and min_row is not None:
+            self.cells[(min_row, min_col)] = target
+        else:
+            # whole rows / columns ("A:A", "2:2") have open bounds
+            self.ranges.append(
+                (min_row or 1, min_col or 1, max_row or 2**31, max_col or 2**31, target)
+            )
+
+    def get(self, row: int, column: int) -> str | None:
+        target = self.cells.get((row, column))
+        if target is None:
+            for min_row, min_col, max_row, max_col, range_target in self.ranges:
+                if min_row <= row <= max_row and min_col <= column <= max_col:
+                    return range_target
+        return target
+
+    def __bool__(self):
+        return bool(self.cells or self.ranges)
+
+
+def find_sheet_path(archive: zipfile.ZipFile, sheet_name: str) -> str:
+    """The path of a sheet part in the archive, from the workbook and its relationships."""
+    workbook_path = ARC_WORKBOOK
+    if ARC_ROOT_RELS in archive.namelist():
+        for rel in get_dependents(archive, ARC_ROOT_RELS):
+            if rel.Type.endswith(OFFICE_DOCUMENT_REL_SUFFIX):
+                workbook_path = rel.target
+                break
+    targets = {rel.Id: rel.target for rel in get_dependents(archive, get_rels_path(workbook_path))}
+    for sheet in fromstring(archive.read(workbook_path)).iter(SHEET_TAG):
+        if sheet.get("name") == sheet_name:
+            return targets[sheet.get(REL_ID_ATTR)]
+    raise KeyError(f"Worksheet {sheet_name} does not exist.")
+
+
+def read_hyperlinks(archive: zipfile.ZipFile, sheet_path: str) -> HyperlinkMap:
+    """Collect the hyperlinks of a sheet from its XML and relations, in one pass.
+
+    Read-only worksheets do not bind hyperlinks to cells, so the `<hyperlink>` elements
+    are streamed from the sheet part and resolved against the sheet's relationships.
+    """
+    rels_path = get_rels_path(sheet_path)
+    targets = {}
+    if rels_path in archive.namelist():
+        targets = {rel.Id: rel.target for rel in get_dependents(archive, rels_path)}
+
+    links = HyperlinkMap()
+    with archive.open(sheet_path) as src:
+        for _, element in iterparse(src):
+            if element.tag == HYPERLINK_TAG:
+                target = targets.get(element.get(REL_ID_ATTR)) or element.get("location")
+                if target and element.get("ref"):
+                    links.add(element.get("ref"), target)
+            elif element.tag == ROW_TAG:
+                # cell data is not needed here, drop it as soon as the row is parsed
+                element.clear()
+    return links
+
+
+def parse_xlsx_sheet(uri: str, sheet_name: str) -> list[Chunk]:
+    """Stream one `.xlsx` sheet row by row, the first row being the header."""
+    with zipfile.ZipFile(uri) as archive:
+        links = read_hyperlinks(archive, find_sheet_path(archive, sheet_name))
+
+    wb = load_workbook(uri, read_only=True, data_only=True)
+    try:
+        sheet = wb[sheet_name]
+        # the declared dimension can be stale (e.g. "A1"), read the rows as they are
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+        cols = list(next(rows, None) or [])
+
+        chunks = []
+        for index, values in enumerate(rows):
+            # skip empty rows, keeping the row position as the chunk index
+            if all(v is None for v in values):
+                continue
+            if len(values) > len(cols):
+                cols += [None] * (len(values) - len(cols))
+
+            page_content = []
+            for col_index, (k, v) in enumerate(zip(cols, values)):
+                if v is None:
+                    continue
+                # +2 to account for header and 1-based index
+                target = links.get(index + 2, col_index + 1) if links else None
+                if target:
+                    page_content.append(f'"{k}":"[{v}]({target})"')
+                else:
+                    page_content.append(f'"{k}":"{v}"')
+            chunks.append(
+                Chunk(
+                    index=index,
+                    content=";".join(page_content),
+                    metadata={"source": uri},
+                )
+            )
+        return chunks
+    finally:
+        wb.close()
+
+
 class ParseExcel(BaseTransform[ExcelState]):
     def __init__(
-        self, encoding: str | None = None, autodetect_encoding: bool = True, *args, **kwargs
+        self,
+        encoding: str | None = None,
+        autodetect_encoding: bool = True,
+        max_workers: int | None = None,
+        *args,
+        **kwargs,
     ):
         super().__init__(*args, **kwargs)
         self.encoding = encoding
         self.autodetect_encoding = autodetect_encoding
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    async def _parse_xlsx(self, uri: str) -> list[Chunk]:
+        wb = load_workbook(uri, read_only=True)
+        sheet_names = wb.sheetnames
+        wb.close()
+
+        if len(sheet_names) <= 1 or self.max_workers <= 1:
+            return [chunk for name in sheet_names for chunk in parse_xlsx_sheet(uri, name)]
+
+        # one worker process per sheet, results are kept in sheet order
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, len(sheet_names))) as pool:
+            results = await asyncio.gather(
+                *[loop.run_in_executor(pool, parse_xlsx_sheet, uri, name) for name in sheet_names]
+            )
+        return [chunk for chunks in results for chunk in chunks]
 
     async def transform(self, state, **kwargs):
         uri = state["uri"]
         chunks = []
         file_extension = os.path.splitext(uri)[-1].lower()
         if file_extension == ".xlsx":
-            wb = load_workbook(uri, data_only=True)
-            for sheet_name in wb.sheetnames:
-                sheet = wb[sheet_name]
-                data = sheet.values
-                cols = next(data)
-                df = pd.DataFrame(data, columns=cols)
-
-                df.dropna(how="all", inplace=True)
-
-                for index, row in df.iterrows():
-                    page_content = []
-                    for col_index, (k, v) in enumerate(row.items()):
-                        if pd.notna(v):
-                            cell = sheet.cell(
-                                row=index + 2, column=col_index + 1
-                            )  # +2 to account for header and 1-based index
-                            if cell.hyperlink:
-                                value = f"[{v}]({cell.hyperlink.target})"
-                                page_content.append(f'"{k}":"{value}"')
-                            else:
-                                page_content.append(f'"{k}":"{v}"')
-                    chunks.append(
-                        Chunk(
-                            index=index,
-                            content=";".join(page_content),
-                            metadata={"source": uri},
-                        )
-                    )
+            chunks = await self._parse_xlsx(uri)
 
         elif file_extension == ".xls":
             excel_file = pd.ExcelFile(uri, engine="xlrd")
@@ -90,9 +209,15 @@ class ExcelPipeline(Pipeline):
         file_path: Path to the file to load.
     """
 
-    def __init__(self, encoding=None, autodetect_encoding=True, *args, **kwargs):
+    def __init__(self, encoding=None, autodetect_encoding=True, max_workers=None, *args, **kwargs):
         super().__init__(
-            transforms=[ParseExcel(encoding=encoding, autodetect_encoding=autodetect_encoding)],
+            transforms=[
+                ParseExcel(
+                    encoding=encoding,
+                    autodetect_encoding=autodetect_encoding,
+                    max_workers=max_workers,
+                )
+            ],
             *args,
             **kwargs,
         )
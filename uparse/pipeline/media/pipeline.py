@@ -1,100 +1,161 @@
+import contextlib
 import os
 import tempfile
 
-from uparse.schema import Document
+import anyio.to_thread
+
+from uparse.schema import Chunk, Document
 
 from ..pipeline import BaseTransform, Pipeline, State
-from .utils import WHISPER_DEFAULT_SETTINGS, transcribe
+from .utils import (
+    SAMPLE_RATE,
+    WHISPER_DEFAULT_SETTINGS,
+    iter_transcribe_segments,
+    load_audio,
+    model_lock,
+    transcribe,
+    transcribe_segmented,
+)
+
+# audio longer than this is split at silences and decoded in batches
+LONG_AUDIO_SECONDS = 600
 
 
 class MediaState(State):
     pass
 
 
-class ParseAudio(BaseTransform[MediaState]):
-    async def transform(self, state, **kwargs):
-        input_data = state["uri"]
+def segment_to_chunk(index: int, segment: dict) -> Chunk:
+    return Chunk(
+        index=index,
+        content=segment["text"].strip(),
+        metadata={"start": segment["start"], "end": segment["end"]},
+    )
+
+
+class TranscribeTransform(BaseTransform[MediaState]):
+    media_kind = "media"
+    media_suffix = ""
+
+    def __init__(self, long_audio_seconds: float = LONG_AUDIO_SECONDS, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.long_audio_seconds = long_audio_seconds
+
+    @contextlib.contextmanager
+    def media_path(self, input_data):
+        temp_path = None
         try:
             if isinstance(input_data, bytes):
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio_file:
-                    temp_audio_file.write(input_data)
-                    temp_audio_path = temp_audio_file.name
+                with tempfile.NamedTemporaryFile(
+                    delete=False, suffix=self.media_suffix
+                ) as temp_file:
+                    temp_file.write(input_data)
+                    temp_path = temp_file.name
+                yield temp_path
             elif isinstance(input_data, str) and os.path.isfile(input_data):
-                temp_audio_path = input_data
+                # uploads are shared by content and cleaned up by storage retention
+                yield input_data
             else:
                 raise ValueError(
-                    "Invalid input data format. Expected audio bytes or audio file path."
+                    f"Invalid input data format. "
+                    f"Expected {self.media_kind} bytes or {self.media_kind} file path."
                 )
+        finally:
+            # Clean up the temporary file
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
 
-            # Transcribe the audio file
+    def transcribe(self, audio) -> Document:
+        with model_lock(self.shared.whisper_model):
+            transcript = self._transcribe(audio)
+
+        doc = Document(summary=transcript["text"])
+        doc.add_chunk([segment_to_chunk(i, s) for i, s in enumerate(transcript["segments"])])
+        return doc
+
+    def _transcribe(self, audio) -> dict:
+        if len(audio) > self.long_audio_seconds * SAMPLE_RATE:
+            transcript = transcribe_segmented(
+                audio=audio,
+                whisper_model=self.shared.whisper_model,
+                batch_size=self.shared.batch_size,
+                **WHISPER_DEFAULT_SETTINGS,
+            )
+        else:
             transcript = transcribe(
-                audio_path=temp_audio_path,
+                audio=audio,
                 whisper_model=self.shared.whisper_model,
                 **WHISPER_DEFAULT_SETTINGS,
             )
+        return transcript
 
-            state["doc"] = Document(summary=transcript["text"])
-            return state
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(temp_audio_path):
-                os.remove(temp_audio_path)
-
+    def _next_segment(self, segments) -> dict | None:
+        # one batch is decoded per call, other parses get the model in between
+        with model_lock(self.shared.whisper_model):
+            return next(segments, None)
 
-class ParseVideo(BaseTransform[MediaState]):
     async def transform(self, state, **kwargs):
-        from moviepy.editor import VideoFileClip
+        with self.media_path(state["uri"]) as media_path:
+            # Demux the audio track straight to 16 kHz mono PCM, no intermediate file
+            audio = await anyio.to_thread.run_sync(load_audio, media_path)
 
-        input_data = state["uri"]
-        try:
-            if isinstance(input_data, bytes):
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video_file:
-                    temp_video_file.write(input_data)
-                    video_path = temp_video_file.name
-            elif isinstance(input_data, str) and os.path.isfile(input_data):
-                video_path = input_data
-            else:
-                raise ValueError(
-                    "Invalid input data format. Expected video bytes or video file path."
-                )
-
-            # Extract audio from the video
-            audio_path = (
-                f"{tempfile.gettempdir()}/{os.path.splitext(os.path.basename(video_path))[0]}.mp3"
-            )
-            video_clip = VideoFileClip(video_path)
-            audio_clip = video_clip.audio
-            audio_clip.write_audiofile(audio_path)
-            audio_clip.close()
-            video_clip.close()
+            # Transcribe the audio
+            state["doc"] = await anyio.to_thread.run_sync(self.transcribe, audio)
+            return state
 
-            # Transcribe the audio file
-            transcript = transcribe(
-                audio_path=audio_path,
+    async def stream_transform(self, state, **kwargs):
+        """Yield the state every time a segment is transcribed and added as a chunk.
+
+        Streaming always decodes segment by segment, whatever the length of the audio. The
+        decoding runs in a worker thread so the event loop can deliver the chunks meanwhile,
+        one batch at a time under the model lock, so concurrent parses share the model safely.
+        """
+        with self.media_path(state["uri"]) as media_path:
+            audio = await anyio.to_thread.run_sync(load_audio, media_path)
+            segments = iter_transcribe_segments(
+                audio=audio,
                 whisper_model=self.shared.whisper_model,
+                batch_size=self.shared.batch_size,
                 **WHISPER_DEFAULT_SETTINGS,
             )
 
-            state["doc"] = Document(summary=transcript["text"])
-            return state
+            state["doc"] = Document(summary="")
+            texts = []
+            while True:
+                segment = await anyio.to_thread.run_sync(self._next_segment, segments)
+                if segment is None:
+                    break
+                texts.append(segment["text"])
+                state["doc"].add_chunk(segment_to_chunk(len(texts) - 1, segment))
+                yield state
 
-        finally:
-            # Clean up the temporary files
-            if os.path.exists(video_path):
-                os.remove(video_path)
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
+            state["doc"].summary = " ".join(texts)
+            yield state
+
+
+class ParseAudio(TranscribeTransform):
+    media_kind = "audio"
+    media_suffix = ".wav"
+
+
+class ParseVideo(TranscribeTransform):
+    media_kind = "video"
+    media_suffix = ".mp4"
 
 
 class AudioPipeline(Pipeline):
     allowed_extensions = [".wav", ".mp3", ".m4a", ".mpeg", ".webm", ".mpga"]
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(transforms=[ParseAudio()], *args, **kwargs)
+    def __init__(self, long_audio_seconds: float = LONG_AUDIO_SECONDS, *args, **kwargs):
+        super().__init__(
+            transforms=[ParseAudio(long_audio_seconds=long_audio_seconds)], *args, **kwargs
+        )
 
 
 class VideoPipeline(Pipeline):
     allowed_extensions = [".mp4"]
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(transforms=[ParseVideo()], *args, **kwargs)
\ No newline at end of file
+    def __init__(self, long_audio_seconds: float = LONG_AUDIO_SECONDS, *args, **kwargs):
+        super().__init__(
+            transforms=[ParseVideo(long_audio_seconds=long_audio_seconds)], *args, **kwargs
+        )
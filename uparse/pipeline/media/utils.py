@@ -17,11 +17,51 @@ This section of the code was adapted from the CLIP repository to integrate audio
 All credits for the original implementation go to OpenAI.
 """
 
+import subprocess
+import threading
+import weakref
+from typing import Iterator
+
 import numpy as np
 
+SAMPLE_RATE = 16000
+
+_model_locks: "weakref.WeakKeyDictionary[object, threading.Lock]" = weakref.WeakKeyDictionary()
+_model_locks_guard = threading.Lock()
+
+
+def model_lock(whisper_model) -> threading.Lock:
+    """The lock to hold while decoding with `whisper_model`.
+
+    Whisper installs kv-cache hooks on the model for every decode, so two decodes running
+    at once on the same model corrupt each other's output.
+    """
+    with _model_locks_guard:
+        lock = _model_locks.get(whisper_model)
+        if lock is None:
+            lock = _model_locks[whisper_model] = threading.Lock()
+        return lock
 
-def transcribe(audio_path: str, whisper_model, **whisper_args):
-    """Transcribe the audio file using whisper"""
+
+def load_audio(file: str, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Decode the first audio stream of a media file to mono float32 PCM at `sr` Hz.
+
+    ffmpeg demuxes and resamples straight into a pipe: video streams are never decoded and
+    nothing is re-encoded or written to disk.
+    """
+    cmd = ["ffmpeg", "-nostdin", "-threads", "0", "-i", file]
+    # first audio stream only, skip video, subtitle and data streams
+    cmd += ["-map", "0:a:0", "-vn", "-sn", "-dn"]
+    cmd += ["-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sr), "-"]
+    try:
+        out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio from {file}: {e.stderr.decode()}") from e
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+
+
+def transcribe(audio: str | np.ndarray, whisper_model, **whisper_args):
+    """Transcribe an audio file or a 16 kHz mono float32 waveform using whisper"""
 
     # Get whisper model
     # NOTE: If mulitple models are selected, this may keep all of them in memory depending on the cache size
@@ -41,13 +81,169 @@ def transcribe(audio_path: str, whisper_model, **whisper_args):
     del whisper_args["temperature_increment_on_fallback"]
 
     transcript = whisper_model.transcribe(
-        audio_path,
+        audio,
         **whisper_args,
     )
 
     return transcript
 
 
+def detect_speech_segments(
+    audio: np.ndarray,
+    sr: int = SAMPLE_RATE,
+    frame_ms: int = 30,
+    min_silence_ms: int = 500,
+    pad_ms: int = 200,
+    max_segment_s: float = 30.0,
+    threshold_db: float | None = None,
+) -> list[tuple[int, int]]:
+    """Split audio at silences, returning (start, end) sample ranges of speech.
+
+    Frames are classified by RMS energy. Silent stretches longer than `min_silence_ms` are
+    dropped, and speech runs longer than `max_segment_s` are cut at their quietest frame so
+    every segment fits in one whisper window.
+    """
+    frame = sr * frame_ms // 1000
+    num_frames = len(audio) // frame
+    if num_frames == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    frames = audio[: num_frames * frame].reshape(num_frames, frame)
+    energy_db = 10 * np.log10(np.mean(frames**2, axis=1) + 1e-10)
+    if threshold_db is None:
+        # relative to the loud end of the recording, with an absolute floor for digital silence
+        threshold_db = max(float(np.percentile(energy_db, 99)) - 35.0, -60.0)
+
+    speech = np.flatnonzero(energy_db > threshold_db)
+    if speech.size == 0:
+        return []
+
+    # runs of speech frames, bridging pauses shorter than min_silence_ms
+    gaps = np.flatnonzero(np.diff(speech) > min_silence_ms // frame_ms)
+    starts = np.r_[speech[0], speech[gaps + 1]]
+    ends = np.r_[speech[gaps], speech[-1]] + 1
+
+    pad = pad_ms // frame_ms
+    max_frames = int(max_segment_s * 1000 // frame_ms) - 2 * pad
+    segments = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        # pad only at silence boundaries, cuts inside speech must not overlap
+        start_pad = pad
+        while end - start > max_frames:
+            # cut at the quietest frame in the second half of the window
+            lo = start + max_frames // 2
+            cut = lo + int(np.argmin(energy_db[lo : start + max_frames]))
+            segments.append((start - start_pad, cut))
+            start, start_pad = cut, 0
+        segments.append((start - start_pad, end + pad))
+
+    return [(max(start, 0) * frame, min(end * frame, len(audio))) for start, end in segments]
+
+
+def _decode_with_fallback(whisper_model, mel, temperatures, whisper_args, language):
+    import whisper
+
+    results = [None] * len(mel)
+    todo = list(range(len(mel)))
+    for temperature in temperatures:
+        options = whisper.DecodingOptions(
+            task=whisper_args.get("task", "transcribe"),
+            language=language,
+            temperature=temperature,
+            without_timestamps=True,
+            fp16=whisper_model.device.type != "cpu",
+        )
+        decoded = whisper.decode(whisper_model, mel[todo], options)
+        retry = []
+        for i, result in zip(todo, decoded):
+            results[i] = result
+            too_repetitive = result.compression_ratio > whisper_args["compression_ratio_threshold"]
+            too_unlikely = result.avg_logprob < whisper_args["logprob_threshold"]
+            silent = result.no_speech_prob > whisper_args["no_speech_threshold"]
+            if (too_repetitive or too_unlikely) and not (silent and too_unlikely):
+                retry.append(i)
+        todo = retry
+        if not todo:
+            break
+    return results
+
+
+def iter_transcribe_segments(
+    audio: np.ndarray, whisper_model, batch_size: int = 8, **whisper_args
+) -> Iterator[dict]:
+    """Transcribe long audio segment by segment, skipping silence.
+
+    Speech segments from `detect_speech_segments` are decoded `batch_size` at a time in one
+    batched whisper forward pass each, with whisper's temperature fallback applied per
+    segment. The language is detected once from the first segment unless given. Segments
+    are yielded as soon as their batch is decoded.
+    """
+    import torch
+    from whisper.audio import log_mel_spectrogram, pad_or_trim
+
+    if whisper_args["temperature_increment_on_fallback"] is not None:
+        temperatures = tuple(
+            np.arange(
+                whisper_args["temperature"],
+                1.0 + 1e-6,
+                whisper_args["temperature_increment_on_fallback"],
+            )
+        )
+    else:
+        temperatures = (whisper_args["temperature"],)
+
+    spans = detect_speech_segments(audio)
+    language = whisper_args.get("language")
+    num_segments = 0
+    for batch_start in range(0, len(spans), batch_size):
+        batch_spans = spans[batch_start : batch_start + batch_size]
+        mel = torch.stack(
+            [
+                log_mel_spectrogram(pad_or_trim(audio[start:end]), whisper_model.dims.n_mels)
+                for start, end in batch_spans
+            ]
+        ).to(whisper_model.device)
+
+        if language is None:
+            _, probs = whisper_model.detect_language(mel[:1])
+            language = max(probs[0], key=probs[0].get)
+
+        results = _decode_with_fallback(whisper_model, mel, temperatures, whisper_args, language)
+        for (start, end), result in zip(batch_spans, results):
+            # same silence rule as whisper.transcribe
+            if (
+                result.no_speech_prob > whisper_args["no_speech_threshold"]
+                and result.avg_logprob < whisper_args["logprob_threshold"]
+            ):
+                continue
+            if not result.text:
+                continue
+            yield {
+                "id": num_segments,
+                "start": start / SAMPLE_RATE,
+                "end": end / SAMPLE_RATE,
+                "text": result.text,
+                "avg_logprob": result.avg_logprob,
+                "no_speech_prob": result.no_speech_prob,
+                "language": language,
+            }
+            num_segments += 1
+
+
+def transcribe_segmented(
+    audio: np.ndarray, whisper_model, batch_size: int = 8, **whisper_args
+) -> dict:
+    """Collect `iter_transcribe_segments` into the shape `whisper_model.transcribe` returns:
+    `text`, `segments` and `language`."""
+    segments = list(iter_transcribe_segments(audio, whisper_model, batch_size, **whisper_args))
+    return {
+        # decoded texts come back stripped
+        "text": " ".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": segments[0]["language"] if segments else whisper_args.get("language"),
+    }
+
+
 # function for enabling CORS on web server
 WHISPER_DEFAULT_SETTINGS = {
     "temperature": 0.0,
@@ -27,6 +27,10 @@ class PDFState(State):
     """document object"""
     doc_images: dict[str, Image.Image]
     text_blocks: list[FullyMergedBlock]
+    dump_details: bool
+    """dump debug details of this parse, sampled when not set"""
+    hierarchical: bool
+    """nest chunks under section chunks built from the headings"""
 
 
 class PDFTransform(BaseTransform[PDFState]):
@@ -6,6 +6,7 @@ from ..marker.postprocessors.markdown import merge_lines, merge_spans
 from ..schema.merged import FullyMergedBlock
 from ..schema.page import Page
 from .align import update_page_bbox, update_page_char_bbox
+from .structure import block_to_chunk, build_section_chunks
 
 
 class PdfiumRead(PDFTransform):
@@ -162,38 +163,36 @@ class MarkerFilterBadSpans(PDFTransform):
 
 
 def _build_chunks(blocks: list[FullyMergedBlock]) -> list[Chunk]:
-    chunks = []
-    for i, block in enumerate(blocks):
-        chunk_type = "markdown"
-        if block.block_type == "Table":
-            chunk_type = "table_csv"
-        elif block.block_type == "Image":
-            chunk_type = "image"
-        elif block.block_type == "Title":
-            chunk_type = "markdown_title"
-        elif block.block_type == "Section-Header":
-            chunk_type = "markdown_section_header"
-        chunk = Chunk(
-            index=i,
-            content=block.text,
-            chunk_type=chunk_type,
-            image_name=block.image_name,
-            table_content=block.table_data,
-            image_content=block.image_data,
-        )
-        chunks.append(chunk)
-    return chunks
+    return [block_to_chunk(block, i) for i, block in enumerate(blocks)]
+
+
+def _set_doc_id(chunks: list[Chunk], doc_id: str):
+    for chunk in chunks:
+        chunk.doc_id = doc_id
+        if chunk.children:
+            _set_doc_id(chunk.children, doc_id)
 
 
 class BuildDocument(PDFTransform):
-    def __init__(self, *args, **kwargs):
+    """Build the document from the text blocks, one chunk per block.
+
+    With `hierarchical`, or when the state asks for it, blocks are nested under section
+    chunks built from the headings and the outline instead, see `build_section_chunks`.
+    """
+
+    def __init__(self, hierarchical: bool = False, *args, **kwargs):
         super().__init__(
             input_key=["full_text", "metadata", "text_blocks"], output_key="doc", *args, **kwargs
         )
+        self.hierarchical = hierarchical
 
     async def transform(self, state: PDFState, **kwargs):
-        chunks = _build_chunks(state["text_blocks"])
         doc = Document(summary=state["full_text"], metadata=state["metadata"])
+        if state.get("hierarchical", self.hierarchical):
+            chunks = build_section_chunks(state["text_blocks"], state["metadata"].get("toc"))
+            _set_doc_id(chunks, doc.id)
+        else:
+            chunks = _build_chunks(state["text_blocks"])
         doc.add_chunk(chunks)
         state["doc"] = doc
         state["pdfium_doc"].close()
@@ -0,0 +1,121 @@
+import re
+
+from rapidfuzz import fuzz, process
+
+from uparse.schema import Chunk
+
+from ..schema.merged import FullyMergedBlock
+
+HEADING_CHUNK_TYPES = {"Title": "markdown_title", "Section-header": "markdown_section_header"}
+
+# headings are OCRed and title-cased, outline titles are not: match them loosely
+TOC_MATCH_CUTOFF = 90
+
+
+def heading_text(text: str) -> str:
+    return text.strip().lstrip("#").strip()
+
+
+def normalize_title(text: str) -> str:
+    return re.sub(r"[\W_]+", "", heading_text(text)).casefold()
+
+
+class TocIndex:
+    """Heading levels from the PDF outline (`metadata["toc"]`), 1 for top-level entries."""
+
+    def __init__(self, toc: list[dict] | None = None):
+        self.titles: list[str] = []
+        self.levels: list[int] = []
+        self.exact: dict[str, int] = {}
+        for item in toc or []:
+            title = normalize_title(item.get("title") or "")
+            if not title:
+                continue
+            # outline levels count the parents of an entry, starting at 0
+            level = item.get("level", 0) + 1
+            self.titles.append(title)
+            self.levels.append(level)
+            self.exact.setdefault(title, level)
+
+    def level(self, text: str) -> int | None:
+        title = normalize_title(text)
+        if not title or not self.titles:
+            return None
+        if title in self.exact:
+            return self.exact[title]
+        match = process.extractOne(
+            title, self.titles, scorer=fuzz.ratio, score_cutoff=TOC_MATCH_CUTOFF
+        )
+        return self.levels[match[2]] if match else None
+
+
+def block_to_chunk(block: FullyMergedBlock, index: int) -> Chunk:
+    chunk_type = "markdown"
+    if block.block_type == "Table":
+        chunk_type = "table_csv"
+    elif block.block_type == "Image":
+        chunk_type = "image"
+    elif block.block_type in HEADING_CHUNK_TYPES:
+        chunk_type = HEADING_CHUNK_TYPES[block.block_type]
+    return Chunk(
+        index=index,
+        content=block.text,
+        chunk_type=chunk_type,
+        image_name=block.image_name,
+        table_content=block.table_data,
+        image_key=block.image_key,
+    )
+
+
+def build_section_chunks(blocks: list[FullyMergedBlock], toc: list[dict] | None) -> list[Chunk]:
+    """Nest the blocks of a document under their headings.
+
+    Every Title and Section-header opens a section chunk whose children are the blocks and
+    subsections up to the next heading of the same or a higher level. Levels come from the
+    outline when the heading is in it, starting at 1. Other titles are level 0, above the
+    outline, and other section headers nest under the innermost outlined section, or are
+    level 1 without one.
+    """
+    toc_index = TocIndex(toc)
+    roots: list[Chunk] = []
+    # open sections, outermost first
+    stack: list[tuple[int, Chunk]] = []
+
+    def attach(chunk: Chunk):
+        siblings = stack[-1][1].children if stack else roots
+        if stack:
+            chunk.parent_chunk_id = stack[-1][1].id
+        chunk.index = len(siblings)
+        siblings.append(chunk)
+
+    for block in blocks:
+        chunk = block_to_chunk(block, 0)
+        if block.block_type not in HEADING_CHUNK_TYPES:
+            chunk.metadata = {
+                "page": block.pnum,
+                "sections": [heading_text(section.content) for _, section in stack],
+            }
+            attach(chunk)
+            continue
+
+        level = toc_index.level(block.text)
+        in_toc = level is not None
+        if level is None and block.block_type == "Title":
+            level = 0
+        elif level is None:
+            outlined = [lvl for lvl, section in stack if section.metadata["in_toc"]]
+            level = outlined[-1] + 1 if outlined else 1
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        chunk.metadata = {"level": level, "page": block.pnum, "in_toc": in_toc}
+        attach(chunk)
+        stack.append((level, chunk))
+
+    def link(chunks: list[Chunk]):
+        for chunk in chunks:
+            if chunk.children:
+                chunk.child_chunk_ids = [child.id for child in chunk.children]
+                link(chunk.children)
+
+    link(roots)
+    return roots
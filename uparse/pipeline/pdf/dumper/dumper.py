@@ -1,10 +1,18 @@
-import multiprocessing
 import os
 import pathlib
+import queue
+import random
 import re
+import threading
 import uuid
+from typing import NamedTuple
+
+from loguru import logger
+from PIL import Image as PILImage
 
 from .._base import PDFState, PDFTransform
+from ..schema.merged import FullyMergedBlock
+from ..schema.page import Page
 from .utils import (
     dump_detection,
     dump_full_text_images,
@@ -15,6 +23,8 @@ from .utils import (
     dump_tables,
 )
 
+DUMP_QUEUE_SIZE = 4
+
 
 def normalize_uri(uri: str):
     basename = os.path.basename(uri)
@@ -26,25 +36,117 @@ def normalize_uri(uri: str):
     return basename
 
 
-def dump_details(out_dir: pathlib.Path, state: PDFState, max_pages: int = 10):
-    out_dir = out_dir / normalize_uri(state["uri"])
-    out_dir.mkdir(parents=True, exist_ok=True)
-    pages = state["pages"][:max_pages]
-    dump_layout(out_dir, pages)
-    dump_ocr(out_dir, pages, state["langs"])
-    dump_detection(out_dir, pages)
-    dump_tables(out_dir, pages, state.get("table_details", {}))
-    dump_order(out_dir, pages)
-    dump_spans(out_dir, pages)
-    dump_full_text_images(out_dir, state["doc"].summary, state["doc_images"], state["text_blocks"])
+class DumpJob(NamedTuple):
+    """The parts of a `PDFState` the dump needs, and nothing else."""
+
+    out_dir: pathlib.Path
+    pages: list[Page]
+    langs: list[str]
+    table_details: dict
+    full_text: str
+    doc_images: dict[str, PILImage.Image]
+    text_blocks: list[FullyMergedBlock]
+
+    @classmethod
+    def from_state(cls, out_dir: pathlib.Path, state: PDFState, max_pages: int = 10):
+        return cls(
+            out_dir=out_dir / normalize_uri(state["uri"]),
+            pages=state["pages"][:max_pages],
+            langs=state["langs"],
+            table_details=state.get("table_details", {}),
+            full_text=state["doc"].summary,
+            doc_images=state["doc_images"],
+            text_blocks=state["text_blocks"],
+        )
+
+
+def dump_details(job: DumpJob):
+    job.out_dir.mkdir(parents=True, exist_ok=True)
+    dump_layout(job.out_dir, job.pages)
+    dump_ocr(job.out_dir, job.pages, job.langs)
+    dump_detection(job.out_dir, job.pages)
+    dump_tables(job.out_dir, job.pages, job.table_details)
+    dump_order(job.out_dir, job.pages)
+    dump_spans(job.out_dir, job.pages)
+    dump_full_text_images(job.out_dir, job.full_text, job.doc_images, job.text_blocks)
+
+
+class DumpWriter:
+    """One long-lived background thread writing dumps from a bounded queue.
+
+    Jobs only reference objects the parse already holds, nothing is copied or pickled. When
+    the queue is full the dump is dropped, a debug aid never slows down or blocks a parse.
+    """
+
+    def __init__(self, max_queue_size: int = DUMP_QUEUE_SIZE):
+        self._queue: queue.Queue[DumpJob] = queue.Queue(maxsize=max_queue_size)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="DumpWriter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                dump_details(job)
+            except Exception as e:
+                logger.exception(e)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, job: DumpJob) -> bool:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            logger.warning(f"[DumpDetails] queue full, dropping dump {job.out_dir.name}")
+            return False
+        return True
+
+    def join(self):
+        """Wait until every queued dump is written."""
+        self._queue.join()
+
+
+dump_writer: DumpWriter = None
+
+
+def get_dump_writer() -> DumpWriter:
+    global dump_writer
+    if not dump_writer:
+        dump_writer = DumpWriter()
+    return dump_writer
 
 
 class DumpDetails(PDFTransform):
-    def __init__(self, out_dir: str = "outputs", *args, **kwargs):
+    """Dump debug images and JSON of a parse, off unless asked for.
+
+    A parse is dumped when its state has `dump_details` set, or else with probability
+    `sample_rate`.
+    """
+
+    def __init__(
+        self,
+        out_dir: str = "outputs",
+        sample_rate: float = 0.0,
+        max_pages: int = 10,
+        *args,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.out_dir = pathlib.Path(out_dir)
+        self.sample_rate = sample_rate
+        self.max_pages = max_pages
 
     async def transform(self, state: PDFState, **kwargs):
-        process = multiprocessing.Process(target=dump_details, args=(self.out_dir, state))
-        process.start()
+        enabled = state.get("dump_details")
+        if enabled is None:
+            enabled = random.random() < self.sample_rate
+        if enabled:
+            get_dump_writer().submit(DumpJob.from_state(self.out_dir, state, self.max_pages))
         return state
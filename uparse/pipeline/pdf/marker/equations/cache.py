@@ -0,0 +1,63 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from PIL import Image
+
+from ..settings import settings
+
+
+def get_model_version(texify_model) -> str:
+    config = getattr(texify_model, "config", None)
+    return getattr(config, "_name_or_path", None) or settings.TEXIFY_MODEL_NAME
+
+
+def hash_equation_image(image: Image.Image, model_version: str) -> str:
+    # Exact hash of the rendered crop, the same formula rendered at the same DPI hashes the same
+    hasher = hashlib.sha256(model_version.encode("utf-8"))
+    hasher.update(f"{image.mode}:{image.size[0]}x{image.size[1]}".encode("utf-8"))
+    hasher.update(image.tobytes())
+    return hasher.hexdigest()
+
+
+class LatexCache:
+    """LRU cache of texify predictions, keyed by equation image hash and model version."""
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._data: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def put(self, key: str, latex: str):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = latex
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        return [self.get(key) for key in keys]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+latex_cache = LatexCache(max_size=settings.TEXIFY_CACHE_SIZE)
@@ -14,7 +14,8 @@ from ...schema.page import Page
 from ..debug.data import dump_equation_debug_data
 from ..pdf.images import render_bbox_image
 from ..settings import settings
-from .inference import get_latex_batched, get_total_texify_tokens
+from .cache import get_model_version, hash_equation_image, latex_cache
+from .inference import get_latex_batched, get_total_texify_tokens_batched
 
 
 def find_equation_blocks(page, processor):
@@ -43,15 +44,16 @@ def find_equation_blocks(page, processor):
 
         insert_points[region_idx] = (find_insert_block(page.blocks, region), 0)
 
+    block_texts = {}
+    for region_idx in range(len(equation_regions)):
+        if len(equation_lines.get(region_idx, [])) > 0:
+            block_texts[region_idx] = " ".join([line.prelim_text for line in equation_lines[region_idx]])
+    region_tokens = dict(zip(block_texts.keys(), get_total_texify_tokens_batched(list(block_texts.values()), processor)))
+
     block_lines_to_remove = defaultdict(set)
     for region_idx, equation_region in enumerate(equation_regions):
-        if region_idx not in equation_lines or len(equation_lines[region_idx]) == 0:
-            block_text = ""
-            total_tokens = 0
-        else:
-            equation_block = equation_lines[region_idx]
-            block_text = " ".join([line.prelim_text for line in equation_block])
-            total_tokens = get_total_texify_tokens(block_text, processor)
+        block_text = block_texts.get(region_idx, "")
+        total_tokens = region_tokens.get(region_idx, 0)
 
         equation_insert = insert_points[region_idx]
         equation_insert_line_idx = equation_insert[1]
@@ -84,10 +86,11 @@ def insert_latex_block(page_blocks: Page, page_equation_blocks, predictions, pnu
     idx = 0
     success_count = 0
     fail_count = 0
+    prediction_tokens = get_total_texify_tokens_batched(predictions, processor)
     for block_number, (insert_block_idx, insert_line_idx, token_count, block_text, equation_bbox) in enumerate(page_equation_blocks):
         latex_text = predictions[block_number]
         conditions = [
-            get_total_texify_tokens(latex_text, processor) < settings.TEXIFY_MODEL_MAX,  # Make sure we didn't get to the overall token max, indicates run-on
+            prediction_tokens[block_number] < settings.TEXIFY_MODEL_MAX,  # Make sure we didn't get to the overall token max, indicates run-on
             len(latex_text) > len(block_text) * .7,
             len(latex_text.strip()) > 0
         ]
@@ -162,8 +165,25 @@ def replace_equations(doc, pages: List[Page], texify_model, batch_multiplier=1):
             images.append(png_image)
             token_counts.append(token_count)
 
+    # Reuse predictions for equation images we have already seen, only run texify on the rest
+    model_version = get_model_version(texify_model)
+    cache_keys = [hash_equation_image(image, model_version) for image in images]
+    predictions = latex_cache.get_many(cache_keys)
+    miss_idxs = [idx for idx, prediction in enumerate(predictions) if prediction is None]
+
     # Make batched predictions
-    predictions = get_latex_batched(images, token_counts, texify_model, batch_multiplier=batch_multiplier)
+    miss_predictions = get_latex_batched(
+        [images[idx] for idx in miss_idxs],
+        [token_counts[idx] for idx in miss_idxs],
+        texify_model,
+        batch_multiplier=batch_multiplier,
+    )
+    for idx, prediction in zip(miss_idxs, miss_predictions):
+        predictions[idx] = prediction
+        # Predictions that ran into max_length come back blank, and max_length depends on the
+        # batch, so a blank is not a property of the image and is not cached
+        if prediction.strip():
+            latex_cache.put(cache_keys[idx], prediction)
 
     # Replace blocks with predictions
     page_start = 0
@@ -186,4 +206,4 @@ def replace_equations(doc, pages: List[Page], texify_model, batch_multiplier=1):
     # If debug mode is on, dump out conversions for comparison
     dump_equation_debug_data(doc, images, converted_spans)
 
-    return pages, {"successful_ocr": successful_ocr, "unsuccessful_ocr": unsuccessful_ocr, "equations": eq_count}
+    return pages, {"successful_ocr": successful_ocr, "unsuccessful_ocr": unsuccessful_ocr, "equations": eq_count, "cached": eq_count - len(miss_idxs)}
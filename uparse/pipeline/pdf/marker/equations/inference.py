@@ -17,29 +17,51 @@ def get_batch_size():
         return 6
     return 2
 
+def get_token_budget():
+    if settings.TEXIFY_TOKEN_BUDGET is not None:
+        return settings.TEXIFY_TOKEN_BUDGET
+    return get_batch_size() * (settings.TEXIFY_MODEL_MAX + settings.TEXIFY_TOKEN_BUFFER)
+
+
+def get_max_length(token_count):
+    return min(token_count, settings.TEXIFY_MODEL_MAX) + settings.TEXIFY_TOKEN_BUFFER
+
+
+def bucket_by_length(token_counts, token_budget):
+    # Sort by length so each batch only decodes as far as its own longest equation,
+    # and grow the batch while batch size * max length stays inside the token budget
+    order = sorted(range(len(token_counts)), key=lambda idx: token_counts[idx])
+    batches = []
+    batch = []
+    for idx in order:
+        max_length = get_max_length(token_counts[idx])
+        if batch and (len(batch) + 1) * max_length > token_budget:
+            batches.append(batch)
+            batch = []
+        batch.append(idx)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
 def get_latex_batched(images, token_counts, texify_model, batch_multiplier=1):
     if len(images) == 0:
         return []
 
     predictions = [""] * len(images)
-    batch_size = get_batch_size() * batch_multiplier
+    batches = bucket_by_length(token_counts, get_token_budget() * batch_multiplier)
 
-    for i in tqdm(range(0, len(images), batch_size), desc="Recognizing equations"):
+    for batch in tqdm(batches, desc="Recognizing equations"):
         # Dynamically set max length to save inference time
-        min_idx = i
-        max_idx = min(min_idx + batch_size, len(images))
-        max_length = max(token_counts[min_idx:max_idx])
-        max_length = min(max_length, settings.TEXIFY_MODEL_MAX)
-        max_length += settings.TEXIFY_TOKEN_BUFFER
+        max_length = get_max_length(max(token_counts[idx] for idx in batch))
 
-        model_output = batch_inference(images[min_idx:max_idx], texify_model, texify_model.processor, max_tokens=max_length)
+        model_output = batch_inference([images[idx] for idx in batch], texify_model, texify_model.processor, max_tokens=max_length)
 
-        for j, output in enumerate(model_output):
-            token_count = get_total_texify_tokens(output, texify_model.processor)
+        token_counts_out = get_total_texify_tokens_batched(model_output, texify_model.processor)
+        for image_idx, output, token_count in zip(batch, model_output, token_counts_out):
             if token_count >= max_length - 1:
                 output = ""
 
-            image_idx = i + j
             predictions[image_idx] = output
     return predictions
 
@@ -50,3 +72,9 @@ def get_total_texify_tokens(text, processor):
     return len(tokens["input_ids"])
 
 
+def get_total_texify_tokens_batched(texts, processor):
+    # One tokenizer call for the whole list instead of one per text
+    if len(texts) == 0:
+        return []
+    tokens = processor.tokenizer(list(texts))
+    return [len(input_ids) for input_ids in tokens["input_ids"]]
@@ -1,4 +1,5 @@
-from uparse.utils import encode_image_to_base64
+from uparse.storage import get_storage
+from uparse.utils import encode_image_to_bytes
 
 from ...schema.bbox import rescale_bbox
 from ...schema.block import Line, Span, find_insert_block
@@ -60,7 +61,8 @@ def extract_page_images(page_obj, page):
             font_size=0,
             span_id=image_filename,
             image=True,
-            image_data=encode_image_to_base64(image),
+            # stored once by content, inlined or referenced when the response is built
+            image_key=get_storage().save_blob(encode_image_to_bytes(image)),
         )
 
         # Sometimes, the block has zero lines
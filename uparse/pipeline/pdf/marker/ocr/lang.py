@@ -32,6 +32,18 @@ def replace_langs_with_codes(
     return langs
 
 
+def langs_to_tesseract_codes(langs: List[str]) -> List[str]:
+    codes = []
+    for lang in langs:
+        # Accept surya codes ("en"), language names ("English") or tesseract codes ("eng")
+        lang = CODE_TO_LANGUAGE.get(lang, lang)
+        if lang in LANGUAGE_TO_TESSERACT_CODE:
+            codes.append(LANGUAGE_TO_TESSERACT_CODE[lang])
+        elif lang in TESSERACT_CODE_TO_LANGUAGE:
+            codes.append(lang)
+    return codes
+
+
 def validate_langs(langs, ocr_engine: str = "surya"):
     if ocr_engine == "surya":
         if langs is None:
@@ -1,18 +1,23 @@
+import csv
 import io
+import os
+import subprocess
 import tempfile
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from itertools import repeat
 from typing import List, Optional
 
 import pypdfium2 as pdfium
+from loguru import logger
 from surya.ocr import run_recognition
 
-from ...schema.block import Block, Line, Span
+from ...schema.block import Block, Line, Span, bbox_from_lines
 from ...schema.page import Page
 from ..pdf.extract_text import get_text_blocks
 from ..pdf.images import render_image
 from ..settings import settings
 from .heuristics import detect_bad_ocr, no_text_found, should_ocr_page
+from .lang import langs_to_tesseract_codes
 
 
 def get_batch_size():
@@ -25,6 +30,12 @@ def get_batch_size():
     return 32
 
 
+def get_ocr_workers():
+    if settings.OCR_PARALLEL_WORKERS is not None:
+        return settings.OCR_PARALLEL_WORKERS
+    return os.cpu_count() or 1
+
+
 def run_ocr(
     doc, pages: List[Page], langs: List[str], rec_model, batch_multiplier=1, ocr_all_pages=False
 ):
@@ -52,6 +63,8 @@ def run_ocr(
         )
     elif ocr_method == "ocrmypdf":
         new_pages = tesseract_recognition(doc, ocr_idxs, langs)
+    elif ocr_method == "tesseract":
+        new_pages = tesseract_tsv_recognition(doc, ocr_idxs, langs, pages=pages)
     else:
         raise ValueError(f"Unknown OCR method {ocr_method}")
 
@@ -130,7 +143,7 @@ def surya_recognition(
 
 def tesseract_recognition(doc, page_idxs, langs: List[str]) -> List[Optional[Page]]:
     pdf_pages = generate_single_page_pdfs(doc, page_idxs)
-    with ThreadPoolExecutor(max_workers=settings.OCR_PARALLEL_WORKERS) as executor:
+    with ThreadPoolExecutor(max_workers=get_ocr_workers()) as executor:
         pages = list(executor.map(_tesseract_recognition, pdf_pages, repeat(langs, len(pdf_pages))))
 
     return pages
@@ -179,3 +192,102 @@ def _tesseract_recognition(in_pdf, langs: List[str]) -> Optional[Page]:
     page = blocks[0]
     page.ocr_method = "tesseract"
     return page
+
+
+def tesseract_tsv_recognition(
+    doc, page_idxs, langs: List[str], pages: Optional[List[Page]] = None
+) -> List[Page]:
+    """Run the tesseract binary on each page in a process pool.
+
+    Pages are handed to the workers as in-memory single page PDFs, rendered there and piped
+    to tesseract, whose TSV output is parsed straight into blocks. When `pages` is given, the
+    detection results and images of the original pages are carried over to the new ones.
+    """
+    if len(page_idxs) == 0:
+        return []
+    lang = "+".join(langs_to_tesseract_codes(langs)) or "eng"
+    pdf_pages = [p.getvalue() for p in generate_single_page_pdfs(doc, page_idxs)]
+    max_workers = min(get_ocr_workers(), len(pdf_pages))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        new_pages = list(
+            executor.map(_tesseract_tsv_recognition, pdf_pages, page_idxs, repeat(lang))
+        )
+
+    if pages is not None:
+        for page_idx, page in zip(page_idxs, new_pages):
+            old_page = pages[page_idx]
+            page.text_lines = old_page.text_lines
+            page.images = old_page.images
+            page.page_image = old_page.page_image
+    return new_pages
+
+
+def _tesseract_tsv_recognition(pdf_bytes: bytes, pnum: int, lang: str) -> Page:
+    pdf = pdfium.PdfDocument(pdf_bytes)
+    image = render_image(pdf[0], dpi=settings.TESSERACT_OCR_DPI)
+    pdf.close()
+
+    png = io.BytesIO()
+    image.save(png, format="PNG")
+    try:
+        result = subprocess.run(
+            ["tesseract", "stdin", "stdout", "-l", lang, "tsv"],
+            input=png.getvalue(),
+            capture_output=True,
+            check=True,
+            timeout=settings.TESSERACT_TIMEOUT,
+            # One page per process already, keep tesseract from spawning its own threads
+            env={**os.environ, "OMP_THREAD_LIMIT": "1"},
+        )
+        tsv = result.stdout.decode("utf-8", errors="replace")
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Tesseract failed on page {pnum}: {e}")
+        tsv = ""
+    return tsv_to_page(tsv, pnum, image.size)
+
+
+def tsv_to_page(tsv: str, pnum: int, image_size) -> Page:
+    """Build a page from tesseract TSV output, one block per paragraph and one span per line."""
+    paragraphs = {}
+    reader = csv.reader(io.StringIO(tsv), delimiter="\t", quoting=csv.QUOTE_NONE)
+    for row in reader:
+        # Level 5 rows are words, skip the header and layout-only rows
+        if len(row) < 12 or row[0] != "5":
+            continue
+        text = row[11].strip()
+        if not text or float(row[10]) < 0:
+            continue
+        left, top, width, height = (int(x) for x in row[6:10])
+        para = paragraphs.setdefault((int(row[2]), int(row[3])), {})
+        para.setdefault(int(row[4]), []).append((text, [left, top, left + width, top + height]))
+
+    blocks = []
+    span_idx = 0
+    for para in paragraphs.values():
+        lines = []
+        for words in para.values():
+            bbox = [
+                min(w[1][0] for w in words),
+                min(w[1][1] for w in words),
+                max(w[1][2] for w in words),
+                max(w[1][3] for w in words),
+            ]
+            span = Span(
+                text=" ".join(w[0] for w in words),
+                bbox=bbox,
+                span_id=f"{pnum}_{span_idx}",
+                font="",
+                font_weight=0,
+                font_size=0,
+            )
+            lines.append(Line(bbox=bbox, spans=[span]))
+            span_idx += 1
+        blocks.append(Block(bbox=bbox_from_lines(lines), pnum=pnum, lines=lines))
+
+    return Page(
+        blocks=blocks,
+        pnum=pnum,
+        bbox=[0, 0, image_size[0], image_size[1]],
+        rotation=0,
+        ocr_method="tesseract",
+    )
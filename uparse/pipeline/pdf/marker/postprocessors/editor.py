@@ -1,7 +1,7 @@
 from collections import defaultdict
-from itertools import chain
 from typing import Optional
 
+import numpy as np
 import torch
 import torch.nn.functional as F
 
@@ -45,21 +45,19 @@ def load_editing_model(device=None, dtype=None):
 
 
 def edit_full_text(text: str, model: Optional[T5ForTokenClassification], batch_multiplier=1):
-    if not model:
+    if not model or not text:
         return text, {}
 
     batch_size = get_batch_size() * batch_multiplier
     tokenized = byt5_tokenize(text, settings.EDITOR_MAX_LENGTH)
     input_ids = tokenized["input_ids"]
-    char_token_lengths = tokenized["char_token_lengths"]
 
     # Run model
     token_masks = []
     for i in range(0, len(input_ids), batch_size):
-        batch_input_ids = tokenized["input_ids"][i : i + batch_size]
-        batch_input_ids = torch.tensor(batch_input_ids, device=model.device)
+        batch_input_ids = torch.from_numpy(input_ids[i : i + batch_size]).to(model.device)
         batch_attention_mask = tokenized["attention_mask"][i : i + batch_size]
-        batch_attention_mask = torch.tensor(batch_attention_mask, device=model.device)
+        batch_attention_mask = torch.from_numpy(batch_attention_mask).to(model.device)
         with torch.inference_mode():
             predictions = model(batch_input_ids, attention_mask=batch_attention_mask)
 
@@ -72,47 +70,57 @@ def edit_full_text(text: str, model: Optional[T5ForTokenClassification], batch_m
         cutoff_prob = max_prob.values < settings.EDITOR_CUTOFF_THRESH
         labels = logits.argmax(-1)
         labels[cutoff_prob] = model.config.label2id["equal"]
-        labels = labels.squeeze().tolist()
-        if len(labels) == settings.EDITOR_MAX_LENGTH:
-            labels = [labels]
-        labels = list(chain.from_iterable(labels))
-        token_masks.extend(labels)
-
-    # List of characters in the text
-    flat_input_ids = list(chain.from_iterable(input_ids))
+        token_masks.append(labels.reshape(-1).numpy())
 
     # Strip special tokens 0,1.  Keep unknown token, although it should never be used
-    assert len(token_masks) == len(flat_input_ids)
-    token_masks = [mask for mask, token in zip(token_masks, flat_input_ids) if token >= 2]
+    token_masks = np.concatenate(token_masks)
+    assert len(token_masks) == input_ids.size
+    token_masks = token_masks[input_ids.reshape(-1) >= 2]
+
+    return apply_edit_labels(
+        text, token_masks, tokenized["char_token_lengths"], model.config.label2id
+    )
+
+
+# Every code point str.isspace() accepts is below U+3001
+_WHITESPACE_CODEPOINTS = np.array([c for c in range(0x3001) if chr(c).isspace()], dtype=np.uint32)
+
 
-    assert len(token_masks) == len(list(text.encode("utf-8")))
+def apply_edit_labels(text: str, token_masks: np.ndarray, char_token_lengths: np.ndarray, label2id):
+    assert len(token_masks) == len(text.encode("utf-8"))
 
+    # Label of the first token of every character, and whether all its tokens say delete
+    char_starts = np.concatenate(([0], np.cumsum(char_token_lengths)[:-1])).astype(np.int64)
+    first_labels = token_masks[char_starts]
+    is_delete = token_masks == label2id["delete"]
+    all_delete = np.logical_and.reduceat(is_delete, char_starts)
+
+    codepoints = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    is_space = np.isin(codepoints, _WHITESPACE_CODEPOINTS)
+
+    # If we delete whitespace, roll with it, otherwise ignore
+    deleted = all_delete & is_space
+    newline = ~all_delete & (first_labels == label2id["newline-1"])
+    space = ~all_delete & (first_labels == label2id["space-1"])
+
+    # Interleave an optional prefix before each kept character
+    out = np.empty(len(codepoints) * 2, dtype=np.uint32)
+    out[0::2] = np.where(newline, ord("\n"), ord(" "))
+    out[1::2] = codepoints
+    keep = np.empty(len(codepoints) * 2, dtype=bool)
+    keep[0::2] = newline | space
+    keep[1::2] = ~deleted
+    out_text = out[keep].tobytes().decode("utf-32-le")
+
+    # Deleted non-whitespace characters are kept but not counted, as before
     edit_stats = defaultdict(int)
-    out_text = []
-    start = 0
-    for i, char in enumerate(text):
-        char_token_length = char_token_lengths[i]
-        masks = token_masks[start : start + char_token_length]
-        labels = [model.config.id2label[mask] for mask in masks]
-        if all(label == "delete" for label in labels):
-            # If we delete whitespace, roll with it, otherwise ignore
-            if char.strip():
-                out_text.append(char)
-            else:
-                edit_stats["delete"] += 1
-        elif labels[0] == "newline-1":
-            out_text.append("\n")
-            out_text.append(char)
-            edit_stats["newline-1"] += 1
-        elif labels[0] == "space-1":
-            out_text.append(" ")
-            out_text.append(char)
-            edit_stats["space-1"] += 1
-        else:
-            out_text.append(char)
-            edit_stats["equal"] += 1
-
-        start += char_token_length
-
-    out_text = "".join(out_text)
+    counts = {
+        "delete": int(deleted.sum()),
+        "newline-1": int(newline.sum()),
+        "space-1": int(space.sum()),
+        "equal": int((~all_delete & ~newline & ~space).sum()),
+    }
+    for label, count in counts.items():
+        if count:
+            edit_stats[label] = count
     return out_text, edit_stats
@@ -95,7 +95,7 @@ def _merge_block_spans(block: Block) -> list[MergedBlock]:
                         pnum=block.pnum,
                         lines=[MergedLine(bbox=block.bbox, text=span.text, fonts=["Image"])],
                         image_name=span.span_id,
-                        image_data=span.image_data,
+                        image_key=span.image_key,
                     )
                 )
             else:
@@ -235,8 +235,9 @@ def merge_lines(
                     FullyMergedBlock(
                         text=block.lines[0].text,
                         block_type=block_type,
+                        pnum=block.pnum,
                         image_name=block.image_name,
-                        image_data=block.image_data,
+                        image_key=block.image_key,
                     )
                 )
                 continue
@@ -249,6 +250,7 @@ def merge_lines(
                     prev_block = FullyMergedBlock(
                         text=block.lines[0].text,
                         block_type=block_type,
+                        pnum=block.pnum,
                         table_data=block.table_data,
                     )
                 else:
@@ -258,6 +260,7 @@ def merge_lines(
                         prev_block = FullyMergedBlock(
                             text=block.lines[0].text,
                             block_type=block_type,
+                            pnum=block.pnum,
                             table_data=block.table_data,
                         )
                     else:
@@ -265,7 +268,7 @@ def merge_lines(
                         prev_block.table_data += "\n" + block.table_data
             else:
                 if not prev_block:
-                    prev_block = FullyMergedBlock(text="", block_type=block_type)
+                    prev_block = FullyMergedBlock(text="", block_type=block_type, pnum=block.pnum)
                 # Join lines in the block together properly
                 for i, line in enumerate(block.lines):
                     line_height = line.bbox[3] - line.bbox[1]
@@ -1,7 +1,7 @@
 from copy import deepcopy
-from itertools import chain
 from typing import Optional, Tuple, Union
 
+import numpy as np
 import torch
 from torch import nn
 from transformers import T5Config, T5PreTrainedModel
@@ -11,29 +11,26 @@ from transformers.utils.model_parallel_utils import assert_device_map, get_devic
 
 
 def byt5_tokenize(text: str, max_length: int, pad_token_id: int = 0):
-    byte_codes = []
-    for char in text:
-        # Add 3 to account for special tokens
-        byte_codes.append([byte + 3 for byte in char.encode('utf-8')])
-
-    tokens = list(chain.from_iterable(byte_codes))
-    # Map each token to the character it represents
-    char_token_lengths = [len(b) for b in byte_codes]
-
-    batched_tokens = []
-    attention_mask = []
-    for i in range(0, len(tokens), max_length):
-        batched_tokens.append(tokens[i:i + max_length])
-        attention_mask.append([1] * len(batched_tokens[-1]))
-
-    # Pad last item
-    if len(batched_tokens[-1]) < max_length:
-        batched_tokens[-1] += [pad_token_id] * (max_length - len(batched_tokens[-1]))
-        attention_mask[-1] += [0] * (max_length - len(attention_mask[-1]))
-
-    return {"input_ids": batched_tokens, "attention_mask": attention_mask, "char_token_lengths": char_token_lengths}
-
-
+    byte_codes = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+    num_tokens = len(byte_codes)
+    num_batches = max(-(-num_tokens // max_length), 1)
+
+    # Add 3 to account for special tokens, pad the last item up to max_length
+    input_ids = np.full(num_batches * max_length, pad_token_id, dtype=np.int64)
+    input_ids[:num_tokens] = byte_codes.astype(np.int64) + 3
+    attention_mask = np.zeros(num_batches * max_length, dtype=np.int64)
+    attention_mask[:num_tokens] = 1
+
+    # Map each character to the number of tokens it spans, characters start on every byte
+    # that is not a UTF-8 continuation byte (0b10xxxxxx)
+    char_starts = np.flatnonzero((byte_codes & 0xC0) != 0x80)
+    char_token_lengths = np.diff(np.append(char_starts, num_tokens))
+
+    return {
+        "input_ids": input_ids.reshape(num_batches, max_length),
+        "attention_mask": attention_mask.reshape(num_batches, max_length),
+        "char_token_lengths": char_token_lengths,
+    }
 
 
 # From https://github.com/osainz59/t5-encoder
@@ -43,7 +43,7 @@ class Settings(BaseSettings):
 
     # OCR
     INVALID_CHARS: List[str] = [chr(0xfffd), "�"]
-    OCR_ENGINE: Optional[Literal["surya", "ocrmypdf"]] = "surya" # Which OCR engine to use, either "surya" or "ocrmypdf".  Defaults to "ocrmypdf" on CPU, "surya" on GPU.
+    OCR_ENGINE: Optional[Literal["surya", "ocrmypdf", "tesseract"]] = "surya" # Which OCR engine to use, one of "surya", "ocrmypdf" or "tesseract".  "tesseract" runs the tesseract binary per page in a process pool, for CPU-only nodes.
     OCR_ALL_PAGES: bool = False # Run OCR on every page even if text can be extracted
 
     ## Surya
@@ -51,8 +51,9 @@ class Settings(BaseSettings):
     RECOGNITION_BATCH_SIZE: Optional[int] = None # Batch size for surya OCR defaults to 64 for cuda, 32 otherwise
 
     ## Tesseract
-    OCR_PARALLEL_WORKERS: int = 2 # How many CPU workers to use for OCR
+    OCR_PARALLEL_WORKERS: Optional[int] = None # How many CPU workers to use for OCR, defaults to the number of CPU cores
     TESSERACT_TIMEOUT: int = 20 # When to give up on OCR
+    TESSERACT_OCR_DPI: int = 300 # DPI to render pages at before running tesseract
     TESSDATA_PREFIX: str = ""
 
     # Texify model
@@ -60,7 +61,9 @@ class Settings(BaseSettings):
     TEXIFY_TOKEN_BUFFER: int = 256 # Number of tokens to buffer above max for texify
     TEXIFY_DPI: int = 96 # DPI to render images at
     TEXIFY_BATCH_SIZE: Optional[int] = None # Defaults to 6 for cuda, 12 otherwise
+    TEXIFY_TOKEN_BUDGET: Optional[int] = None # Max decode tokens per batch (batch size * max length), defaults to a full batch of TEXIFY_MODEL_MAX
     TEXIFY_MODEL_NAME: str = "vikp/texify"
+    TEXIFY_CACHE_SIZE: int = 4096 # Number of equation predictions kept in the in-memory LRU cache, 0 disables it
 
     # Layout model
     SURYA_LAYOUT_DPI: int = 96
@@ -82,6 +85,10 @@ class Settings(BaseSettings):
     ENABLE_EDITOR_MODEL: bool = False # The editor model can create false positives
     EDITOR_CUTOFF_THRESH: float = 0.9 # Ignore predictions below this probability
 
+    # Quantized CPU inference
+    QUANTIZE_CPU_MODELS: bool = False # Dynamic int8 quantization of linear layers for the recognition, order, texify, editor, table and whisper models on CPU
+    QUANTIZED_MODEL_CACHE_DIR: str = "~/.cache/uparse/quantized" # Where quantized models are cached for fast restarts
+
     # Debug
     DEBUG: bool = False # Enable debug logging
     DEBUG_DATA_FOLDER: Optional[str] = None
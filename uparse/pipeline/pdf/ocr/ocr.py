@@ -5,7 +5,7 @@ from surya.ocr import run_recognition
 
 from .._base import PDFState, PDFTransform
 from ..marker.ocr.heuristics import detect_bad_ocr, no_text_found, should_ocr_page
-from ..marker.ocr.recognition import tesseract_recognition
+from ..marker.ocr.recognition import tesseract_recognition, tesseract_tsv_recognition
 from ..marker.settings import settings
 from ..schema.block import Block, Line, Span
 from ..schema.page import Page
@@ -127,6 +127,9 @@ class MarkerOCR(PDFTransform):
         elif ocr_method == "ocrmypdf":
             new_pages = tesseract_recognition(doc, ocr_idxs, langs)
             new_pages = [Page.model_validate(page.model_dump()) for page in new_pages]
+        elif ocr_method == "tesseract":
+            logger.debug(f"Tesseract OCR idxs: {ocr_idxs}")
+            new_pages = tesseract_tsv_recognition(doc, ocr_idxs, langs, pages=pages)
         else:
             raise ValueError(f"Unknown OCR method {ocr_method}")
 
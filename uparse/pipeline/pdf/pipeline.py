@@ -25,11 +25,13 @@ from .text_clean.text_clean import MarkerCleanText
 class PDFVanillaPipeline(Pipeline):
     allowed_extensions = [".pdf", ".png", ".jpg", ".jpeg", ".tiff", ".tif", ".bmp", ".webp"]
 
-    def __init__(self, models: dict, *args, **kwargs):
-        super().__init__(models=models, transforms=_build_vanilla_trans(), *args, **kwargs)
+    def __init__(self, models: dict, dump_sample_rate: float = 0.0, *args, **kwargs):
+        super().__init__(
+            models=models, transforms=_build_vanilla_trans(dump_sample_rate), *args, **kwargs
+        )
 
 
-def _build_vanilla_trans() -> Pipeline:
+def _build_vanilla_trans(dump_sample_rate: float = 0.0) -> Pipeline:
     return [
         # Basic Operations
         PdfiumRead(),
@@ -57,5 +59,5 @@ def _build_vanilla_trans() -> Pipeline:
         MarkerMergeBlocks(),
         MarkerCleanText(),
         BuildDocument(),
-        DumpDetails(),
+        DumpDetails(sample_rate=dump_sample_rate),
     ]
@@ -22,7 +22,7 @@ class Span(BboxElement):
     image: Optional[bool] = None
     table: Optional[bool] = None
     table_data: Optional[str] = None
-    image_data: Optional[str] = None
+    image_key: Optional[str] = None
 
     @field_validator("text")
     @classmethod
@@ -20,13 +20,15 @@ class MergedBlock(BboxElement):
     pnum: int
     block_type: Optional[str]
     image_name: Optional[str] = None
-    image_data: Optional[str] = None
+    image_key: Optional[str] = None
     table_data: Optional[str] = None
 
 
 class FullyMergedBlock(BaseModel):
     text: str
     block_type: str
+    pnum: Optional[int] = None
+    """page of the first line of the block"""
     image_name: Optional[str] = None
-    image_data: Optional[str] = None
+    image_key: Optional[str] = None
     table_data: Optional[str] = None
\ No newline at end of file
@@ -183,7 +183,7 @@ def format_tables(pages: List[Page]):
             if table_idx not in table_insert_points:
                 continue
 
-            if page.ocr_method == "surya":
+            if page.ocr_method == "surya" or not page.char_blocks:
                 table_rows = get_table_ocr(page, table_layout)
             else:
                 table_rows = get_table_tatr(page, table_layout)
@@ -150,9 +150,11 @@ class BaseTransform(Generic[StateType]):
             yield state
             return
         else:
+            stream = None
             for t in self._transforms:
-                async for s in t.stream(state, *args):
-                    yield s
+                stream = t.stream_from(stream, state, *args)
+            async for s in stream:
+                yield s
 
     async def __call__(
         self, state: StateType, listeners: list[TransformListener] | None = None, **kwargs
@@ -193,6 +195,20 @@ class BaseTransform(Generic[StateType]):
         await getattr(listener, self._exit_callback)(self, state)
         return
 
+    async def stream_from(
+        self, upstream: AsyncGenerator[StateType, None] | None, state: StateType, *args
+    ) -> AsyncGenerator[StateType, None]:
+        """Stream after `upstream`, the stream of the transforms before this one.
+
+        Transforms run one after the other by default. Override to work on the states of the
+        upstream while it is still running.
+        """
+        if upstream is not None:
+            async for s in upstream:
+                yield s
+        async for s in self.stream(state, *args):
+            yield s
+
     async def transform(self, state: StateType, **kwargs) -> StateType:
         return state
 
@@ -1,8 +1,13 @@
-from langchain_community.document_loaders import TextLoader
+import itertools
+from typing import Iterator
+
+import anyio.to_thread
 
 from uparse.schema import Chunk, Document
 
 from ..pipeline import BaseTransform, Pipeline, State
+from ..utils import iter_file_encodings
+from .reader import SplitMode, read_text
 
 
 class TextState(State):
@@ -11,39 +16,86 @@ class TextState(State):
 
 class TextTransform(BaseTransform[TextState]):
     def __init__(
-        self, encoding: str | None = None, autodetect_encoding: bool = True, *args, **kwargs
+        self,
+        encoding: str | None = None,
+        autodetect_encoding: bool = True,
+        split: SplitMode = "none",
+        batch_size: int = 256,
+        *args,
+        **kwargs,
     ):
         super().__init__(*args, **kwargs)
         self.encoding = encoding
         self.autodetect_encoding = autodetect_encoding
+        self.split = split
+        self.batch_size = batch_size
+
+    def _iter_batches(self, uri: str) -> Iterator[list[Chunk]]:
+        """Yield the chunks of the file `batch_size` at a time, as the file is read."""
+        error = None
+        done = 0
+        for encoding in iter_file_encodings(uri, self.encoding, self.autodetect_encoding):
+            try:
+                # a later encoding re-reads the file, chunks already read are kept
+                pieces = itertools.islice(
+                    enumerate(read_text(uri, encoding, self.split)), done, None
+                )
+                while batch := list(itertools.islice(pieces, self.batch_size)):
+                    yield [
+                        Chunk(index=i, content=content, metadata={"source": uri, **metadata})
+                        for i, (content, metadata) in batch
+                    ]
+                    done = batch[-1][0] + 1
+                return
+            except UnicodeDecodeError as e:
+                error = e
+
+        raise RuntimeError(f"Error loading {uri}") from error
 
     async def transform(self, state, **kwargs):
         uri = state["uri"]
-        loader = TextLoader(
-            uri, encoding=self.encoding, autodetect_encoding=self.autodetect_encoding
-        )
-        chunks = []
-        for i, doc in enumerate(loader.load()):
-            chunks.append(
-                Chunk(
-                    index=i,
-                    content=doc.page_content,
-                    metadata={"source": uri},
-                )
-            )
+        batches = await anyio.to_thread.run_sync(lambda: list(self._iter_batches(uri)))
         state["doc"] = Document(metadata={"source": uri})
-        state["doc"].add_chunk(chunks)
+        for chunks in batches:
+            state["doc"].add_chunk(chunks)
         return state
 
+    async def stream_transform(self, state, **kwargs):
+        """Yield the state every time a batch of chunks is split off the file.
+
+        The file is read in a worker thread, the event loop delivers the chunks meanwhile.
+        """
+        uri = state["uri"]
+        state["doc"] = Document(metadata={"source": uri})
+        batches = self._iter_batches(uri)
+        while True:
+            chunks = await anyio.to_thread.run_sync(next, batches, None)
+            if chunks is None:
+                break
+            state["doc"].add_chunk(chunks)
+            yield state
+        if not state["doc"].chunks:
+            # an empty file still ends with its document
+            yield state
+
 
 class TextPipeline(Pipeline):
     allowed_extensions = [".txt", ".md"]
 
     def __init__(
-        self, encoding: str | None = None, autodetect_encoding: bool = True, *args, **kwargs
+        self,
+        encoding: str | None = None,
+        autodetect_encoding: bool = True,
+        split: SplitMode = "none",
+        *args,
+        **kwargs,
     ):
         super().__init__(
-            transforms=[TextTransform(encoding=encoding, autodetect_encoding=autodetect_encoding)],
+            transforms=[
+                TextTransform(
+                    encoding=encoding, autodetect_encoding=autodetect_encoding, split=split
+                )
+            ],
             *args,
             **kwargs,
         )
@@ -0,0 +1,106 @@
+import codecs
+import io
+import locale
+import mmap
+import os
+import re
+from typing import Iterable, Iterator, Literal
+
+SplitMode = Literal["none", "heading", "paragraph"]
+
+READ_BLOCK_SIZE = 1 << 20
+
+HEADING_PATTERN = re.compile(r"#{1,6}[ \t]+(.*?)[ \t#]*$")
+FENCE_PREFIXES = ("```", "~~~")
+
+
+def iter_decoded(path: str, encoding: str | None = None, block_size: int = READ_BLOCK_SIZE):
+    """Decode a file block by block from a memory map.
+
+    Newlines are translated like `open()` does in text mode, also across block borders.
+    Raises `UnicodeDecodeError` as soon as an undecodable block is reached.
+    """
+    encoding = encoding or locale.getpreferredencoding(False)
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate=True)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start in range(0, len(mm), block_size):
+                text = decoder.decode(mm[start : start + block_size])
+                if text:
+                    yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def iter_lines(blocks: Iterable[str]) -> Iterator[str]:
+    """Re-cut decoded blocks into lines, keeping line ends."""
+    tail = []
+    for block in blocks:
+        lines = block.split("\n")
+        if len(lines) == 1:
+            tail.append(block)
+            continue
+        tail.append(lines[0])
+        yield "".join(tail) + "\n"
+        for line in lines[1:-1]:
+            yield line + "\n"
+        tail = [lines[-1]] if lines[-1] else []
+    if tail:
+        yield "".join(tail)
+
+
+def split_paragraphs(lines: Iterable[str]) -> Iterator[tuple[str, dict]]:
+    """Group lines into paragraphs separated by blank lines."""
+    current = []
+    for line in lines:
+        if line.isspace():
+            if current:
+                yield "".join(current).strip(), {}
+                current = []
+        else:
+            current.append(line)
+    if current:
+        yield "".join(current).strip(), {}
+
+
+def split_markdown_sections(lines: Iterable[str]) -> Iterator[tuple[str, dict]]:
+    """Group lines into sections, each starting at an ATX heading outside code fences."""
+    current = []
+    heading = None
+    in_fence = False
+    for line in lines:
+        if line.startswith(FENCE_PREFIXES):
+            in_fence = not in_fence
+        elif not in_fence and line.startswith("#"):
+            match = HEADING_PATTERN.match(line.rstrip("\n"))
+            if match:
+                content = "".join(current).strip()
+                if content:
+                    yield content, {"heading": heading}
+                current = []
+                heading = match.group(1)
+        current.append(line)
+    content = "".join(current).strip()
+    if content:
+        yield content, {"heading": heading}
+
+
+def read_text(
+    path: str, encoding: str | None = None, split: SplitMode = "none"
+) -> Iterator[tuple[str, dict]]:
+    """Yield `(content, metadata)` pieces of a text file while it is being read.
+
+    With `split="none"` the whole file is a single piece, as a plain `read()` would give.
+    """
+    blocks = iter_decoded(path, encoding)
+    if split == "none":
+        yield "".join(blocks), {}
+    elif split == "paragraph":
+        yield from split_paragraphs(iter_lines(blocks))
+    elif split == "heading":
+        yield from split_markdown_sections(iter_lines(blocks))
+    else:
+        raise ValueError(f"Unsupported split mode: {split}")
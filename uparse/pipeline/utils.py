@@ -1,7 +1,12 @@
 """Document loader helpers."""
 
-import concurrent.futures
-from typing import NamedTuple, Optional, cast
+import codecs
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, NamedTuple, Optional, cast
 
 
 class FileEncoding(NamedTuple):
@@ -15,32 +20,250 @@ class FileEncoding(NamedTuple):
     """The language of the file."""
 
 
-def detect_file_encodings(file_path: str, timeout: int = 5) -> list[FileEncoding]:
+# bytes read from the start of the file, where BOMs and headers live
+ENCODING_SAMPLE_PREFIX_SIZE = 256 * 1024
+# evenly spaced blocks sampled from the rest of the file
+ENCODING_SAMPLE_NUM_BLOCKS = 16
+ENCODING_SAMPLE_BLOCK_SIZE = 16 * 1024
+# stop feeding the detector once it is this confident
+ENCODING_MIN_CONFIDENCE = 0.95
+ENCODING_FEED_SIZE = 64 * 1024
+ENCODING_CACHE_SIZE = 1024
+# the last resort streams the file in blocks of this size, looking for the bytes that are
+# not utf-8, and runs detection on the lines around them
+ENCODING_SCAN_BLOCK_SIZE = 1024 * 1024
+ENCODING_SCAN_CONTEXT_SIZE = 64 * 1024
+
+_encoding_cache: OrderedDict[str, list[FileEncoding]] = OrderedDict()
+_encoding_cache_lock = threading.Lock()
+
+
+def read_encoding_sample(
+    file_path: str,
+    prefix_size: int = ENCODING_SAMPLE_PREFIX_SIZE,
+    num_blocks: int = ENCODING_SAMPLE_NUM_BLOCKS,
+    block_size: int = ENCODING_SAMPLE_BLOCK_SIZE,
+) -> list[bytes]:
+    """Read a bounded byte sample of the file: a prefix plus evenly spaced blocks after it.
+
+    Blocks other than the very start and end of the file are cut to whole lines, so
+    multi-byte characters are never split in half.
+    """
+    file_size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        prefix = f.read(prefix_size)
+        if len(prefix) < file_size:
+            prefix = prefix[: prefix.rfind(b"\n") + 1] or prefix
+        blocks = [prefix]
+        if file_size <= prefix_size or num_blocks <= 0:
+            return blocks
+
+        # spread the blocks over the rest of the file, the last one ending at the end of file
+        last = max(file_size - block_size, prefix_size)
+        step = (last - prefix_size) / max(num_blocks - 1, 1)
+        for offset in sorted({prefix_size + round(i * step) for i in range(num_blocks)}):
+            f.seek(offset)
+            block = f.read(block_size)
+            block = block[block.find(b"\n") + 1 :]
+            if offset + block_size < file_size:
+                block = block[: block.rfind(b"\n") + 1]
+            if block:
+                blocks.append(block)
+    return blocks
+
+
+def _sample_key(blocks: list[bytes]) -> str:
+    # detection only ever sees the sampled bytes, so their hash identifies the result exactly
+    hasher = hashlib.blake2b(digest_size=20)
+    for block in blocks:
+        hasher.update(len(block).to_bytes(8, "little"))
+        hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _is_utf8(blocks: list[bytes]) -> bool:
+    try:
+        for block in blocks:
+            block.decode("utf-8")
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def _chardet_detect(blocks: list[bytes], deadline: float, min_confidence: float) -> list[dict]:
+    import chardet
+    from chardet import UniversalDetector
+
+    # ascii-only pieces carry no evidence, feed the others first so the detector sees them
+    # before it reaches its own byte limit or stops early
+    pieces = [
+        block[i : i + ENCODING_FEED_SIZE]
+        for block in blocks
+        for i in range(0, len(block), ENCODING_FEED_SIZE)
+    ]
+    pieces.sort(key=bytes.isascii)
+    detector = UniversalDetector()
+    fed = []
+    for piece in pieces:
+        if time.monotonic() > deadline:
+            raise TimeoutError("Timeout reached while detecting encoding")
+        fed.append(piece)
+        detector.feed(piece)
+        if detector.done:
+            break
+    best = detector.close()
+    if best["encoding"] is not None and best["confidence"] >= min_confidence:
+        return [best]
+
+    # not confident enough, rank all candidates on the (bounded) bytes seen so far
+    encodings = cast(list[dict], chardet.detect_all(b"".join(fed)))
+    if best["encoding"] is not None:
+        encodings = [best] + [e for e in encodings if e["encoding"] != best["encoding"]]
+    return encodings
+
+
+def detect_file_encodings(
+    file_path: str,
+    timeout: int = 5,
+    prefix_size: int = ENCODING_SAMPLE_PREFIX_SIZE,
+    num_blocks: int = ENCODING_SAMPLE_NUM_BLOCKS,
+    block_size: int = ENCODING_SAMPLE_BLOCK_SIZE,
+    min_confidence: float = ENCODING_MIN_CONFIDENCE,
+) -> list[FileEncoding]:
     """Try to detect the file encoding.
 
     Returns a list of `FileEncoding` tuples with the detected encodings ordered
     by confidence.
 
+    Only a bounded sample of the file is read (see `read_encoding_sample`). A sample that
+    decodes as utf-8 is taken as utf-8, otherwise it is fed to chardet incrementally until
+    it is `min_confidence` sure. Results are cached by the hash of the sample, so the CSV
+    and text pipelines share them.
+
     Args:
         file_path: The path to the file to detect the encoding for.
         timeout: The timeout in seconds for the encoding detection.
+        prefix_size: Number of bytes read from the start of the file.
+        num_blocks: Number of blocks sampled from the rest of the file.
+        block_size: Size of each sampled block in bytes.
+        min_confidence: Confidence at which detection stops early.
     """
-    import chardet
+    deadline = time.monotonic() + timeout
+    blocks = read_encoding_sample(file_path, prefix_size, num_blocks, block_size)
+    return _detect_sample_encodings(file_path, blocks, deadline, min_confidence)
+
 
-    def read_and_detect(file_path: str) -> list[dict]:
-        with open(file_path, "rb") as f:
-            rawdata = f.read()
-        return cast(list[dict], chardet.detect_all(rawdata))
+def _detect_sample_encodings(
+    file_path: str, blocks: list[bytes], deadline: float, min_confidence: float
+) -> list[FileEncoding]:
+    key = _sample_key(blocks)
+    with _encoding_cache_lock:
+        if key in _encoding_cache:
+            _encoding_cache.move_to_end(key)
+            return list(_encoding_cache[key])
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future = executor.submit(read_and_detect, file_path)
+    if _is_utf8(blocks):
+        # like chardet, report a leading BOM as utf-8-sig so decoding drops it
+        encoding = "UTF-8-SIG" if blocks[0].startswith(codecs.BOM_UTF8) else "utf-8"
+        encodings = [{"encoding": encoding, "confidence": 1.0, "language": ""}]
+    else:
         try:
-            encodings = future.result(timeout=timeout)
-        except concurrent.futures.TimeoutError:
-            raise TimeoutError(
-                f"Timeout reached while detecting encoding for {file_path}"
-            )
+            encodings = _chardet_detect(blocks, deadline, min_confidence)
+        except TimeoutError:
+            raise TimeoutError(f"Timeout reached while detecting encoding for {file_path}")
 
     if all(encoding["encoding"] is None for encoding in encodings):
         raise RuntimeError(f"Could not detect encoding for {file_path}")
-    return [FileEncoding(**enc) for enc in encodings if enc["encoding"] is not None]
+
+    results = []
+    for enc in encodings:
+        if enc["encoding"] is None:
+            continue
+        # "ascii" only means no non-ascii byte was sampled, utf-8 decodes the same and more
+        if enc["encoding"].lower() == "ascii":
+            enc = {**enc, "encoding": "utf-8"}
+        if all(r.encoding != enc["encoding"] for r in results):
+            results.append(FileEncoding(enc["encoding"], enc["confidence"], enc.get("language")))
+
+    with _encoding_cache_lock:
+        _encoding_cache[key] = results
+        while len(_encoding_cache) > ENCODING_CACHE_SIZE:
+            _encoding_cache.popitem(last=False)
+    return list(results)
+
+
+def read_non_utf8_sample(
+    file_path: str,
+    deadline: float,
+    block_size: int = ENCODING_SCAN_BLOCK_SIZE,
+    context_size: int = ENCODING_SCAN_CONTEXT_SIZE,
+) -> bytes | None:
+    """Stream the file looking for its first bytes that are not utf-8.
+
+    Returns the whole lines within `context_size` bytes after them, or None when the file
+    is utf-8 all along. Memory stays bounded by the block size whatever the file size.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    offset = 0
+    with open(file_path, "rb") as f:
+        while block := f.read(block_size):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timeout reached while detecting encoding for {file_path}")
+            try:
+                decoder.decode(block)
+            except UnicodeDecodeError as e:
+                # read around the error, back to the start of its line
+                start = max(offset + e.start - context_size, 0)
+                f.seek(start)
+                sample = f.read(2 * context_size)
+                bad = offset + e.start - start
+                line_start = sample.rfind(b"\n", 0, bad) + 1
+                line_end = sample.rfind(b"\n", bad, bad + context_size) + 1 or len(sample)
+                return sample[line_start:line_end]
+            offset += len(block)
+    return None
+
+
+def iter_file_encodings(
+    file_path: str,
+    encoding: Optional[str] = None,
+    autodetect_encoding: bool = True,
+    timeout: int = 5,
+) -> Iterator[Optional[str]]:
+    """Yield the encodings to try for a file, in order.
+
+    The explicit `encoding` comes first; detection only runs when it is not given or
+    once the caller moves past it, i.e. after it failed to decode the file. When every
+    encoding detected on the sample failed, the file is streamed to find the bytes that
+    are not utf-8 and detection runs on those. Iteration ends when detection times out or
+    finds nothing, the caller reports the file as unreadable.
+    """
+    if encoding or not autodetect_encoding:
+        yield encoding
+    if not autodetect_encoding:
+        return
+    tried = {encoding}
+    try:
+        detected_encodings = detect_file_encodings(file_path, timeout=timeout)
+    except (TimeoutError, RuntimeError):
+        return
+    for detected in detected_encodings:
+        if detected.encoding not in tried:
+            tried.add(detected.encoding)
+            yield detected.encoding
+
+    # the sample can miss a stray byte deep in the file
+    deadline = time.monotonic() + timeout
+    try:
+        sample = read_non_utf8_sample(file_path, deadline)
+        if sample is None:
+            return
+        detected_encodings = _detect_sample_encodings(
+            file_path, [sample], deadline, ENCODING_MIN_CONFIDENCE
+        )
+    except (TimeoutError, RuntimeError):
+        return
+    for detected in detected_encodings:
+        if detected.encoding not in tried:
+            tried.add(detected.encoding)
+            yield detected.encoding
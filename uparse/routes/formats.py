@@ -0,0 +1,173 @@
+"""Response formats of `/parse`, chosen by the `Accept` header.
+
+- `application/json`: the default, serialized with orjson when it is installed.
+- `application/msgpack`: the same structure as JSON, with `image_content` as raw bytes.
+- `application/vnd.apache.arrow.stream`: an Arrow IPC stream holding one table row per
+  chunk, with `image_content` as a binary column. The response fields and the document
+  without its chunks are stored as JSON in the schema metadata under `uparse.response`.
+"""
+
+import base64
+import functools
+import importlib.util
+import json
+
+from fastapi.responses import Response
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+MEDIA_TYPE_ALIASES = {
+    JSON_MEDIA_TYPE: JSON_MEDIA_TYPE,
+    MSGPACK_MEDIA_TYPE: MSGPACK_MEDIA_TYPE,
+    "application/x-msgpack": MSGPACK_MEDIA_TYPE,
+    "application/vnd.msgpack": MSGPACK_MEDIA_TYPE,
+    ARROW_MEDIA_TYPE: ARROW_MEDIA_TYPE,
+}
+
+# formats other than JSON need an optional dependency
+MEDIA_TYPE_MODULES = {
+    MSGPACK_MEDIA_TYPE: "msgpack",
+    ARROW_MEDIA_TYPE: "pyarrow",
+}
+
+ARROW_RESPONSE_KEY = b"uparse.response"
+
+
+@functools.cache
+def is_available(media_type: str) -> bool:
+    module = MEDIA_TYPE_MODULES.get(media_type)
+    return module is None or importlib.util.find_spec(module) is not None
+
+
+def negotiate_media_type(accept: str | None) -> str:
+    """Pick the response media type from an `Accept` header, JSON unless asked otherwise.
+
+    Formats whose dependency is not installed are skipped, clients tell the format they
+    got from the `Content-Type` of the response.
+    """
+    if not accept:
+        return JSON_MEDIA_TYPE
+    ranges = []
+    for i, item in enumerate(accept.split(",")):
+        media_type, *params = [p.strip() for p in item.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        media_type = MEDIA_TYPE_ALIASES.get(media_type.lower())
+        if q > 0 and media_type and is_available(media_type):
+            ranges.append((-q, i, media_type))
+    return min(ranges)[2] if ranges else JSON_MEDIA_TYPE
+
+
+def _decode_images(chunks: list[dict]):
+    for chunk in chunks:
+        if chunk.get("image_content"):
+            chunk["image_content"] = base64.b64decode(chunk["image_content"])
+        if chunk.get("children"):
+            _decode_images(chunk["children"])
+
+
+def encode_json(content: dict) -> bytes:
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+    if orjson is not None:
+        try:
+            # metadata from user files can have non-str keys, json turns them into strings too
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # e.g. integers beyond 64 bits, which the json module handles
+            pass
+    return json.dumps(content, ensure_ascii=False).encode("utf-8")
+
+
+def encode_msgpack(content: dict) -> bytes:
+    import msgpack
+
+    doc = content.get("data")
+    if isinstance(doc, dict) and doc.get("chunks"):
+        _decode_images(doc["chunks"])
+    return msgpack.packb(content)
+
+
+def flatten_chunks(chunks: list[dict]) -> list[tuple[dict, int | None]]:
+    """Flatten nested chunks to `(chunk, parent_row)` in pre-order."""
+    rows = []
+    stack = [(chunk, None) for chunk in reversed(chunks)]
+    while stack:
+        chunk, parent_row = stack.pop()
+        row = len(rows)
+        rows.append((chunk, parent_row))
+        stack.extend((child, row) for child in reversed(chunk.get("children") or []))
+    return rows
+
+
+def encode_arrow(content: dict) -> bytes:
+    import pyarrow as pa
+
+    doc = dict(content.get("data") or {})
+    rows = flatten_chunks(doc.pop("chunks", None) or [])
+    chunks = [chunk for chunk, _ in rows]
+    table = pa.table(
+        {
+            "id": pa.array([c["id"] for c in chunks], pa.string()),
+            "index": pa.array([c["index"] for c in chunks], pa.int64()),
+            "parent_row": pa.array([parent_row for _, parent_row in rows], pa.int64()),
+            "parent_chunk_id": pa.array([c["parent_chunk_id"] for c in chunks], pa.string()),
+            "child_chunk_ids": pa.array(
+                [c["child_chunk_ids"] for c in chunks], pa.list_(pa.string())
+            ),
+            "doc_id": pa.array([c["doc_id"] for c in chunks], pa.string()),
+            "chunk_type": pa.array([c["chunk_type"] for c in chunks], pa.string()),
+            "content": pa.array([c["content"] for c in chunks], pa.large_string()),
+            "image_name": pa.array([c["image_name"] for c in chunks], pa.string()),
+            "image_content": pa.array(
+                [
+                    base64.b64decode(c["image_content"]) if c["image_content"] else None
+                    for c in chunks
+                ],
+                pa.large_binary(),
+            ),
+            "image_key": pa.array([c["image_key"] for c in chunks], pa.string()),
+            "table_content": pa.array([c["table_content"] for c in chunks], pa.large_string()),
+            "num_tokens": pa.array([c["num_tokens"] for c in chunks], pa.int64()),
+            "created_at": pa.array([c["created_at"] for c in chunks], pa.string()),
+            "updated_at": pa.array([c["updated_at"] for c in chunks], pa.string()),
+            "metadata": pa.array(
+                [
+                    encode_json(c["metadata"]).decode("utf-8")
+                    if c["metadata"] is not None
+                    else None
+                    for c in chunks
+                ],
+                pa.string(),
+            ),
+        }
+    )
+    response = {**content, "data": doc or None}
+    table = table.replace_schema_metadata({ARROW_RESPONSE_KEY: encode_json(response)})
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+ENCODERS = {
+    JSON_MEDIA_TYPE: encode_json,
+    MSGPACK_MEDIA_TYPE: encode_msgpack,
+    ARROW_MEDIA_TYPE: encode_arrow,
+}
+
+
+def render(content: dict, media_type: str, status_code: int = 200) -> Response:
+    return Response(
+        content=ENCODERS[media_type](content), status_code=status_code, media_type=media_type
+    )
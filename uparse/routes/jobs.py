@@ -0,0 +1,185 @@
+import asyncio
+import time
+import uuid
+from typing import AsyncGenerator, Callable, Literal
+
+import anyio.to_thread
+from loguru import logger
+from pydantic import BaseModel
+
+from uparse.pipeline import Pipeline
+from uparse.schema import Chunk, Document
+
+# finished jobs are kept this long for their results to be fetched
+JOB_TTL_SECONDS = 3600
+# jobs share the models of the server, more are kept pending until one finishes
+JOB_MAX_RUNNING = 2
+# finished jobs hold all their chunks in memory, the oldest are dropped beyond this
+JOB_MAX_FINISHED = 64
+
+JobStatusType = Literal["pending", "running", "done", "failed"]
+
+
+class JobStatus(BaseModel):
+    id: str
+    status: JobStatusType
+    num_chunks: int = 0
+    """chunks produced so far"""
+    msg: str | None = None
+    """error message of a failed job"""
+    process_time: float | None = None
+
+
+class ParseJob:
+    """A parse running in the background, whose chunks can be followed while it runs.
+
+    Chunks are kept in the order the pipeline produces them, so a client that lost its
+    connection resumes by asking for the chunks after the ones it already received.
+    """
+
+    def __init__(self):
+        self.id = str(uuid.uuid4())
+        self.status: JobStatusType = "pending"
+        self.chunks: list[Chunk] = []
+        self.doc: Document | None = None
+        self.msg: str | None = None
+        self.process_time: float | None = None
+        self.finished_at: float | None = None
+        self._changed = asyncio.Condition()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def to_status(self) -> JobStatus:
+        return JobStatus(
+            id=self.id,
+            status=self.status,
+            num_chunks=len(self.chunks),
+            msg=self.msg,
+            process_time=self.process_time,
+        )
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def run(self, pipeline: Pipeline, state: dict, on_chunks: Callable[[list[Chunk]], None]):
+        """Run the pipeline, `on_chunks` prepares new chunks before they are published.
+
+        `on_chunks` runs in a worker thread, it may block on storage.
+        """
+        start_time = time.time()
+        self.status = "running"
+        doc = None
+        try:
+            async for state in pipeline.stream(state):
+                doc = state.get("doc")
+                if doc is None or len(doc.chunks) == len(self.chunks):
+                    continue
+                new_chunks = doc.chunks[len(self.chunks) :]
+                await anyio.to_thread.run_sync(on_chunks, new_chunks)
+                self.chunks.extend(new_chunks)
+                await self._notify()
+            self.doc = doc.model_copy(update={"chunks": []}) if doc else None
+            self.status = "done"
+        except Exception as e:
+            logger.exception(e)
+            self.msg = str(e)
+            self.status = "failed"
+        finally:
+            self.process_time = time.time() - start_time
+            self.finished_at = time.time()
+            await self._notify()
+
+    def result(self) -> Document | None:
+        if self.doc is None:
+            return None
+        doc = self.doc.model_copy(update={"chunks": []})
+        doc.add_chunk(list(self.chunks))
+        return doc
+
+    async def follow(self, offset: int = 0) -> AsyncGenerator[Chunk, None]:
+        """Yield the chunks from `offset` on, waiting for new ones until the job finishes."""
+        index = max(offset, 0)
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.finished:
+                return
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.chunks) or self.finished)
+
+
+class JobRegistry:
+    """The jobs of this server process.
+
+    At most `max_running` jobs run at once, the others stay pending in submission order.
+    Finished jobs expire after `ttl` seconds, and only the `max_finished` most recent ones
+    are kept. Jobs live in the memory of one process: run the server with a single worker
+    to use them, another worker does not know the jobs of this one.
+    """
+
+    def __init__(
+        self,
+        ttl: float = JOB_TTL_SECONDS,
+        max_running: int = JOB_MAX_RUNNING,
+        max_finished: int = JOB_MAX_FINISHED,
+    ):
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self.jobs: dict[str, ParseJob] = {}
+        self._slots = asyncio.Semaphore(max_running)
+
+    def prune(self):
+        now = time.time()
+        finished = []
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at is None:
+                continue
+            if now - job.finished_at > self.ttl:
+                del self.jobs[job_id]
+            else:
+                finished.append(job)
+        finished.sort(key=lambda job: job.finished_at)
+        for job in finished[: max(len(finished) - self.max_finished, 0)]:
+            del self.jobs[job.id]
+
+    async def _run(
+        self,
+        job: ParseJob,
+        pipeline: Pipeline,
+        state: dict,
+        on_chunks: Callable[[list[Chunk]], None],
+    ):
+        async with self._slots:
+            await job.run(pipeline, state, on_chunks)
+        self.prune()
+
+    def submit(
+        self, pipeline: Pipeline, state: dict, on_chunks: Callable[[list[Chunk]], None]
+    ) -> ParseJob:
+        self.prune()
+        job = ParseJob()
+        self.jobs[job.id] = job
+        # keep a reference, the event loop only holds weak ones to its tasks
+        job._task = asyncio.get_running_loop().create_task(
+            self._run(job, pipeline, state, on_chunks)
+        )
+        return job
+
+    def get(self, job_id: str) -> ParseJob | None:
+        self.prune()
+        return self.jobs.get(job_id)
+
+
+job_registry: JobRegistry = None
+
+
+def get_job_registry() -> JobRegistry:
+    global job_registry
+    if not job_registry:
+        job_registry = JobRegistry()
+    return job_registry
@@ -1,15 +1,18 @@
+import base64
 import os
 import time
-from typing import Annotated, Type
+from typing import Annotated, AsyncGenerator, Literal, Type
 
-from fastapi import APIRouter, File, Form, UploadFile
-from fastapi.responses import JSONResponse
+import anyio.to_thread
+from fastapi import APIRouter, File, Form, Header, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from loguru import logger
 from pydantic import BaseModel
 
 from uparse.models import get_all_models
 from uparse.pipeline import (
     AudioPipeline,
+    ChunkingTransform,
     CSVPipeline,
     ExcelPipeline,
     PDFVanillaPipeline,
@@ -20,8 +23,12 @@ from uparse.pipeline import (
     VideoPipeline,
     WordPipeline,
 )
-from uparse.schema import Document
+from uparse.schema import Chunk, Document
 from uparse.storage import get_storage
+from uparse.utils import image_mime_type
+
+from .formats import JSON_MEDIA_TYPE, negotiate_media_type, render
+from .jobs import JobStatus, get_job_registry
 
 router = APIRouter()
 storage = get_storage()
@@ -39,6 +46,12 @@ pipelines: list[Type[Pipeline]] = [
 allowed_extensions = [p.allowed_extensions for p in pipelines]
 allowed_extensions = [ext for ext_list in allowed_extensions for ext in ext_list]
 
+# chunks re-chunked to `max_tokens` are merged up to at least this size
+DEFAULT_MIN_TOKENS = 64
+
+# inline: base64 in `image_content`, ref: only `image_key`, none: no image data at all
+ImageMode = Literal["inline", "ref", "none"]
+
 
 class AllowedExtensionsResponse(BaseModel):
     allowed_extensions: list[str]
@@ -47,14 +60,129 @@ class AllowedExtensionsResponse(BaseModel):
 class ParseResponse(BaseModel):
     code: int = 200
     msg: str = "success"
-    data: Document | AllowedExtensionsResponse | None = None
+    data: Document | AllowedExtensionsResponse | JobStatus | None = None
     process_time: float | None = None
 
-    def to_response(self):
-        return JSONResponse(
-            status_code=self.code,
-            content=self.model_dump(),
+    def to_response(self, media_type: str = JSON_MEDIA_TYPE):
+        return render(self.model_dump(), media_type, status_code=self.code)
+
+
+class ParseStreamEvent(BaseModel):
+    """One line of the streamed (NDJSON) parse response.
+
+    `chunk` events carry chunks as soon as the pipeline produces them. The final `document`
+    event carries the document without its chunks, which were all sent before it.
+    """
+
+    event: Literal["chunk", "document", "error"]
+    code: int = 200
+    msg: str = "success"
+    data: Chunk | Document | None = None
+    process_time: float | None = None
+
+    def to_line(self) -> str:
+        return self.model_dump_json() + "\n"
+
+
+def resolve_images(chunks: list[Chunk], images: ImageMode):
+    """Fill in or drop the image data of chunks, which only carry blob keys until now.
+
+    Loading blobs can go to a remote backend, call it from a worker thread.
+    """
+    for chunk in chunks:
+        if images == "inline":
+            if chunk.image_key and chunk.image_content is None:
+                try:
+                    blob = storage.load_blob(chunk.image_key)
+                    chunk.image_content = base64.b64encode(blob).decode("utf-8")
+                except OSError as e:
+                    logger.warning(f"Could not load image {chunk.image_key}: {e}")
+        else:
+            chunk.image_content = None
+            if images == "none":
+                chunk.image_key = None
+        if chunk.children:
+            resolve_images(chunk.children, images)
+
+
+def parse_byte_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    """Parse a single `bytes=` range into inclusive offsets.
+
+    Returns None when the whole content should be sent (no range, or several ranges, which
+    servers may ignore) and raises ValueError when the range cannot be satisfied.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start, _, end = range_header[len("bytes=") :].strip().partition("-")
+    if not start:
+        # suffix range, the last `end` bytes
+        if not end.isdigit() or int(end) == 0 or size == 0:
+            raise ValueError(range_header)
+        return max(size - int(end), 0), size - 1
+    if not start.isdigit() or (end and not end.isdigit()):
+        return None
+    start, end = int(start), min(int(end) if end else size - 1, size - 1)
+    if start >= size or start > end:
+        raise ValueError(range_header)
+    return start, end
+
+
+def make_pipeline(filename: str, max_tokens: int | None = None) -> Pipeline | None:
+    file_ext = os.path.splitext(filename)[1]
+    for pipeline_cls in pipelines:
+        if file_ext in pipeline_cls.allowed_extensions:
+            break
+    else:
+        return None
+    pipeline = pipeline_cls(
+        models=get_all_models(),
+        listeners=[PerfTracker(print_enter=True), PyTorchMemoryCleaner()],
+        batch_size=16,
+    )
+    if max_tokens:
+        pipeline = pipeline | ChunkingTransform(
+            max_tokens=max_tokens, min_tokens=min(DEFAULT_MIN_TOKENS, max_tokens)
         )
+    return pipeline
+
+
+def make_state(
+    path: str, dump_details: bool | None = None, hierarchical: bool | None = None
+) -> dict:
+    # debug dumps are sampled by the pipeline unless the request asks either way
+    state = {"uri": path}
+    if dump_details is not None:
+        state["dump_details"] = dump_details
+    # only pipelines with a document structure (PDF) read it
+    if hierarchical is not None:
+        state["hierarchical"] = hierarchical
+    return state
+
+
+async def stream_parse(
+    pipeline: Pipeline, state: dict, images: ImageMode = "inline"
+) -> AsyncGenerator[str, None]:
+    start_time = time.time()
+    doc = None
+    num_sent = 0
+    try:
+        async for state in pipeline.stream(state):
+            doc = state.get("doc")
+            if doc is None:
+                continue
+            await anyio.to_thread.run_sync(resolve_images, doc.chunks[num_sent:], images)
+            for chunk in doc.chunks[num_sent:]:
+                yield ParseStreamEvent(event="chunk", data=chunk).to_line()
+            num_sent = len(doc.chunks)
+        end_time = time.time()
+        yield ParseStreamEvent(
+            event="document",
+            data=doc.model_copy(update={"chunks": []}) if doc else None,
+            process_time=end_time - start_time,
+        ).to_line()
+    except Exception as e:
+        logger.exception(e)
+        yield ParseStreamEvent(event="error", code=500, msg=str(e)).to_line()
 
 
 @router.get("/allowed_extensions")
@@ -67,27 +195,149 @@ async def parse_doc(
     file: Annotated[UploadFile, File()],
     has_watermark: Annotated[bool, Form()] = False,
     force_convert_pdf: Annotated[bool, Form()] = False,
+    stream: Annotated[bool, Form()] = False,
+    images: Annotated[ImageMode, Form()] = "inline",
+    dump_details: Annotated[bool | None, Form()] = None,
+    max_tokens: Annotated[int | None, Form(gt=0)] = None,
+    hierarchical: Annotated[bool | None, Form()] = None,
+    accept: Annotated[str | None, Header()] = None,
 ):
     logger.debug(
         f"[Parse] {file.filename} has_watermark={has_watermark} force_convert_pdf={force_convert_pdf}"
+        f" stream={stream} images={images}"
     )
-    file_ext = os.path.splitext(file.filename)[1]
-    path = storage.save_upload(file.filename, await file.read()).as_posix()
-    for pipeline_cls in pipelines:
-        if file_ext in pipeline_cls.allowed_extensions:
-            break
-    else:
+    content = await file.read()
+    path = (await anyio.to_thread.run_sync(storage.save_upload, file.filename, content)).as_posix()
+    pipeline = make_pipeline(file.filename, max_tokens)
+    if pipeline is None:
         return ParseResponse(code=400, msg="Unsupported file type").to_response()
-    pipeline = pipeline_cls(
-        models=get_all_models(),
-        listeners=[PerfTracker(print_enter=True), PyTorchMemoryCleaner()],
-        batch_size=16,
-    )
+    state = make_state(path, dump_details, hierarchical)
+    if stream:
+        return StreamingResponse(
+            stream_parse(pipeline, state, images), media_type="application/x-ndjson"
+        )
     try:
         start_time = time.time()
-        state = await pipeline({"uri": path})
+        state = await pipeline(state)
+        await anyio.to_thread.run_sync(resolve_images, state["doc"].chunks, images)
         end_time = time.time()
-        return ParseResponse(data=state["doc"], process_time=end_time - start_time)
+        return ParseResponse(data=state["doc"], process_time=end_time - start_time).to_response(
+            negotiate_media_type(accept)
+        )
     except Exception as e:
         logger.exception(e)
         return ParseResponse(code=500, msg=str(e)).to_response()
+
+
+@router.get("/blobs/{key}")
+async def get_blob(
+    key: str,
+    range: Annotated[str | None, Header()] = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    try:
+        # a blob evicted from the local cache is fetched back from the backend
+        blob = await anyio.to_thread.run_sync(storage.load_blob, key)
+    except (ValueError, OSError):
+        return ParseResponse(code=404, msg="Blob not found").to_response()
+
+    # blobs are addressed by their content, the key is a strong validator that never expires
+    etag = f'"{key}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags:
+            return Response(status_code=304, headers=headers)
+
+    media_type = image_mime_type(blob)
+    try:
+        byte_range = parse_byte_range(range, len(blob))
+    except ValueError:
+        headers["Content-Range"] = f"bytes */{len(blob)}"
+        return Response(status_code=416, headers=headers)
+    if byte_range is None:
+        return Response(content=blob, media_type=media_type, headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(blob)}"
+    return Response(
+        content=blob[start : end + 1], status_code=206, media_type=media_type, headers=headers
+    )
+
+
+@router.post("/jobs")
+async def submit_job(
+    file: Annotated[UploadFile, File()],
+    has_watermark: Annotated[bool, Form()] = False,
+    force_convert_pdf: Annotated[bool, Form()] = False,
+    images: Annotated[ImageMode, Form()] = "inline",
+    dump_details: Annotated[bool | None, Form()] = None,
+    max_tokens: Annotated[int | None, Form(gt=0)] = None,
+    hierarchical: Annotated[bool | None, Form()] = None,
+):
+    """Start a parse in the background and return its job right away.
+
+    Jobs are kept in the memory of the worker process that took them, so the job endpoints
+    need the server to run with a single worker.
+    """
+    logger.debug(f"[Parse] job for {file.filename} images={images}")
+    content = await file.read()
+    path = (await anyio.to_thread.run_sync(storage.save_upload, file.filename, content)).as_posix()
+    pipeline = make_pipeline(file.filename, max_tokens)
+    if pipeline is None:
+        return ParseResponse(code=400, msg="Unsupported file type").to_response()
+    job = get_job_registry().submit(
+        pipeline,
+        make_state(path, dump_details, hierarchical),
+        on_chunks=lambda chunks: resolve_images(chunks, images),
+    )
+    return ParseResponse(data=job.to_status()).to_response()
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = get_job_registry().get(job_id)
+    if job is None:
+        return ParseResponse(code=404, msg="Job not found").to_response()
+    return ParseResponse(data=job.to_status()).to_response()
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, accept: Annotated[str | None, Header()] = None):
+    job = get_job_registry().get(job_id)
+    if job is None:
+        return ParseResponse(code=404, msg="Job not found").to_response()
+    if job.status == "failed":
+        return ParseResponse(code=500, msg=job.msg).to_response()
+    if job.status != "done":
+        return ParseResponse(code=202, msg="Job is not done", data=job.to_status()).to_response()
+    return ParseResponse(data=job.result(), process_time=job.process_time).to_response(
+        negotiate_media_type(accept)
+    )
+
+
+async def stream_job(job, offset: int) -> AsyncGenerator[str, None]:
+    async for chunk in job.follow(offset):
+        yield ParseStreamEvent(event="chunk", data=chunk).to_line()
+    if job.status == "failed":
+        yield ParseStreamEvent(event="error", code=500, msg=job.msg).to_line()
+    else:
+        yield ParseStreamEvent(
+            event="document", data=job.doc, process_time=job.process_time
+        ).to_line()
+
+
+@router.get("/jobs/{job_id}/stream")
+async def get_job_stream(job_id: str, offset: Annotated[int, Query(ge=0)] = 0):
+    """Stream the chunks of a job as NDJSON, skipping the first `offset` chunks.
+
+    A client that got disconnected passes the number of chunks it already received to pick
+    up where it left off, the job keeps running meanwhile.
+    """
+    job = get_job_registry().get(job_id)
+    if job is None:
+        return ParseResponse(code=404, msg="Job not found").to_response()
+    return StreamingResponse(stream_job(job, offset), media_type="application/x-ndjson")
@@ -1,4 +1,5 @@
-import uuid
+import random
+import time
 from typing import Literal, Union
 
 import arrow
@@ -9,18 +10,44 @@ class BaseModel(pydantic.BaseModel):
     pass
 
 
+_formatted_time_cache: dict[tuple[str, str], tuple[int, str]] = {}
+
+
 def get_current_time_formatted(format: str | None = None, tz: str | None = None) -> str:
     if format is None:
         format = "YYYY-MM-DD HH:mm:ss"
     if tz is None:
         tz = "Asia/Shanghai"
-    return arrow.now(tz).format(format)
+    if "S" in format:
+        # sub-second tokens, nothing to share
+        return arrow.now(tz).format(format)
+    # formatting is the expensive part, do it once per second and share the string between
+    # the document and all of its chunks created within that second
+    now = int(time.time())
+    cached = _formatted_time_cache.get((format, tz))
+    if cached is None or cached[0] != now:
+        cached = (now, arrow.Arrow.fromtimestamp(now, tzinfo=tz).format(format))
+        _formatted_time_cache[(format, tz)] = cached
+    return cached[1]
+
+
+def generate_id() -> str:
+    """A random (version 4) UUID string.
+
+    Uses the `random` module instead of `os.urandom`, which is several times cheaper when
+    creating millions of chunks. Ids only need to be unique, not unpredictable.
+    """
+    value = random.getrandbits(128)
+    value = (value & ~(0xF000 << 64)) | (0x4000 << 64)  # version 4
+    value = (value & ~(0xC000 << 48)) | (0x8000 << 48)  # RFC 4122 variant
+    h = f"{value:032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
 
 
 class Document(BaseModel):
     """document 由多个 chunk 组成"""
 
-    id: str = pydantic.Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = pydantic.Field(default_factory=generate_id)
     """UUID"""
     summary: str | None = None
 
@@ -30,27 +57,39 @@ class Document(BaseModel):
     updated_at: str = pydantic.Field(default_factory=get_current_time_formatted)
     metadata: dict | None = None
 
-    chunks: list["Chunk"] = []
+    chunks: list["Chunk"] = pydantic.Field(default_factory=list)
 
     def get_chunks(self) -> list["Chunk"]:
+        """The leaf chunks, in document order: chunks with children stand for them."""
         flatten_chunks = []
-        for chunk in self.chunks:
+        stack = list(reversed(self.chunks))
+        while stack:
+            chunk = stack.pop()
             if chunk.children:
-                flatten_chunks.extend(chunk.children)
+                stack.extend(reversed(chunk.children))
             else:
                 flatten_chunks.append(chunk)
         return flatten_chunks
 
-    def _add_chunk(self, chunk: "Chunk"):
-        chunk.doc_id = self.id
-        self.chunks.append(chunk)
+    def _add_chunks(self, chunks: list["Chunk"]):
+        for chunk in chunks:
+            chunk.doc_id = self.id
+        num_chunks = len(self.chunks)
+        self.chunks.extend(chunks)
+        if self.child_chunk_ids is None or len(self.child_chunk_ids) != num_chunks:
+            # first add, or chunks were assigned directly
+            self.child_chunk_ids = [c.id for c in self.chunks]
+        else:
+            self.child_chunk_ids.extend(c.id for c in chunks)
         self.num_chunks = len(self.chunks)
-        self.child_chunk_ids = [c.id for c in self.chunks]
+
+    def _add_chunk(self, chunk: "Chunk"):
+        self._add_chunks([chunk])
 
     def add_chunk(self, chunk: Union["Chunk", list["Chunk"]]):
+        """Append one chunk or a list of chunks, in time linear in the chunks added."""
         if isinstance(chunk, list):
-            for c in chunk:
-                self._add_chunk(c)
+            self._add_chunks(chunk)
         else:
             self._add_chunk(chunk)
 
@@ -58,7 +97,7 @@ class Document(BaseModel):
 class Chunk(BaseModel):
     """chunk 由多个 token 组成"""
 
-    id: str = pydantic.Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = pydantic.Field(default_factory=generate_id)
     """chunk UUID"""
     index: int | None = None
     """index of the chunk in the document"""
@@ -94,6 +133,8 @@ class Chunk(BaseModel):
     image_name: str | None = None
     image_content: str | None = None
     """encoded image content"""
+    image_key: str | None = None
+    """key of the image in the blob store, served by `GET /parse/blobs/{image_key}`"""
     table_content: str | None = None
     """table content, decided by chunk_type"""
     num_tokens: int | None = None
@@ -105,4 +146,4 @@ class Chunk(BaseModel):
     metadata: dict | None = None
     """Othre metadata"""
 
-    children: list["Chunk"] = []
+    children: list["Chunk"] = pydantic.Field(default_factory=list)
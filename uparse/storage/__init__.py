@@ -1,3 +1,14 @@
-from .storage import Storage, get_storage
+from .retention import RetentionPolicy, collect_garbage, start_retention
+from .settings import StorageSettings
+from .storage import Storage, StorageEntry, create_storage, get_storage
 
-__all__ = ["Storage", "get_storage"]
\ No newline at end of file
+__all__ = [
+    "Storage",
+    "StorageEntry",
+    "StorageSettings",
+    "RetentionPolicy",
+    "collect_garbage",
+    "create_storage",
+    "get_storage",
+    "start_retention",
+]
@@ -0,0 +1,107 @@
+import asyncio
+import itertools
+import time
+from typing import NamedTuple
+
+import anyio.to_thread
+from loguru import logger
+
+from .settings import StorageSettings
+from .storage import Storage
+
+
+class RetentionPolicy(NamedTuple):
+    max_age_seconds: float | None = None
+    """delete entries older than this"""
+    max_bytes: int | None = None
+    """then delete the oldest entries until each location fits in this size"""
+    min_age_seconds: float = 3600
+    """never delete younger entries, they may still be in use"""
+
+    @classmethod
+    def from_settings(cls, settings: StorageSettings) -> "RetentionPolicy":
+        return cls(
+            max_age_seconds=(
+                settings.RETENTION_MAX_AGE_HOURS * 3600
+                if settings.RETENTION_MAX_AGE_HOURS is not None
+                else None
+            ),
+            max_bytes=settings.RETENTION_MAX_BYTES,
+            min_age_seconds=settings.RETENTION_MIN_AGE_SECONDS,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age_seconds is not None or self.max_bytes is not None
+
+
+def _location(key: str) -> str:
+    # local files and remote objects are sized separately
+    return key.split("://", 1)[0] if "://" in key else "local"
+
+
+def collect_garbage(storage: Storage, policy: RetentionPolicy, now: float | None = None) -> dict:
+    """Apply the retention policy once, returns the number and size of deleted entries."""
+    now = time.time() if now is None else now
+    deleted = {"entries": 0, "bytes": 0}
+
+    def _delete(entry):
+        try:
+            storage.delete(entry.key)
+        except OSError as e:
+            logger.warning(f"[Retention] could not delete {entry.key}: {e}")
+            return
+        deleted["entries"] += 1
+        deleted["bytes"] += entry.size
+
+    max_age = policy.max_age_seconds
+    if max_age is not None:
+        max_age = max(max_age, policy.min_age_seconds)
+    kept = []
+    for entry in storage.iter_entries():
+        if max_age is not None and now - entry.mtime > max_age:
+            _delete(entry)
+        else:
+            kept.append(entry)
+
+    if policy.max_bytes is not None:
+        kept.sort(key=lambda entry: _location(entry.key))
+        for _, entries in itertools.groupby(kept, key=lambda entry: _location(entry.key)):
+            entries = sorted(entries, key=lambda entry: entry.mtime)
+            total = sum(entry.size for entry in entries)
+            for entry in entries:
+                if total <= policy.max_bytes or now - entry.mtime < policy.min_age_seconds:
+                    break
+                _delete(entry)
+                total -= entry.size
+    return deleted
+
+
+async def run_retention(storage: Storage, policy: RetentionPolicy, interval: float):
+    """Apply the retention policy every `interval` seconds, off the event loop."""
+    while True:
+        try:
+            deleted = await anyio.to_thread.run_sync(collect_garbage, storage, policy)
+            if deleted["entries"]:
+                logger.info(
+                    f"[Retention] deleted {deleted['entries']} entries, {deleted['bytes']} bytes"
+                )
+        except Exception as e:
+            logger.exception(e)
+        await asyncio.sleep(interval)
+
+
+retention_task: asyncio.Task = None
+
+
+def start_retention(storage: Storage, settings: StorageSettings | None = None):
+    """Start the background retention task once, on the running event loop."""
+    global retention_task
+    settings = settings or StorageSettings()
+    policy = RetentionPolicy.from_settings(settings)
+    if retention_task is not None or not policy.enabled:
+        return retention_task
+    retention_task = asyncio.get_running_loop().create_task(
+        run_retention(storage, policy, settings.RETENTION_INTERVAL_SECONDS)
+    )
+    return retention_task
@@ -0,0 +1,134 @@
+import hashlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator
+
+from loguru import logger
+
+from .storage import Storage, StorageEntry, _write_atomic
+
+S3_KEY_PREFIX = "s3://"
+S3_PUT_WORKERS = 4
+
+
+class S3Storage(Storage):
+    """Keep uploads and blobs in an S3-compatible bucket, with local copies as a cache.
+
+    Pipelines still work on local paths. Objects are written once, since their keys are
+    their content hashes, and blobs evicted from the local cache are fetched back on demand.
+    Remote writes run on a small thread pool once the local copy is written, so saving never
+    waits on the bucket. Pass `client` to use any boto3-compatible client, e.g. one bound to
+    a local stand-in.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "uparse",
+        endpoint_url: str | None = None,
+        client=None,
+        put_workers: int = S3_PUT_WORKERS,
+        *args,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        if not bucket:
+            raise ValueError("S3 storage needs a bucket")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.endpoint_url = endpoint_url
+        self._client = client
+        self._puts = ThreadPoolExecutor(max_workers=put_workers, thread_name_prefix="S3Put")
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("s3", endpoint_url=self.endpoint_url)
+        return self._client
+
+    def _object_key(self, *parts: str) -> str:
+        return "/".join([self.prefix, *parts]) if self.prefix else "/".join(parts)
+
+    def _exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def _put_once(self, key: str, content: bytes):
+        if self._exists(key):
+            # copy in place to refresh LastModified, retention counts the age from the last use
+            self.client.copy_object(
+                Bucket=self.bucket,
+                Key=key,
+                CopySource={"Bucket": self.bucket, "Key": key},
+                MetadataDirective="REPLACE",
+            )
+        else:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=content)
+
+    @staticmethod
+    def _log_put_error(future: Future):
+        if future.exception() is not None:
+            logger.warning(f"[Storage] S3 put failed: {future.exception()}")
+
+    def _put_in_background(self, key: str, content: bytes) -> Future:
+        future = self._puts.submit(self._put_once, key, content)
+        future.add_done_callback(self._log_put_error)
+        return future
+
+    def save_upload(self, key: str, content: bytes):
+        path = super().save_upload(key, content)
+        digest = path.parent.name
+        self._put_in_background(self._object_key("uploads", digest[:2], digest, path.name), content)
+        return path
+
+    def save_blob(self, content: bytes) -> str:
+        key = super().save_blob(content)
+        self._put_in_background(self._object_key("blobs", key[:2], key), content)
+        return key
+
+    def close(self):
+        """Wait for the pending remote writes."""
+        self._puts.shutdown(wait=True)
+
+    def load_blob(self, key: str) -> bytes:
+        path = self.blob_path(key)
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            pass
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.client.get_object(
+                Bucket=self.bucket, Key=self._object_key("blobs", key[:2], key)
+            )
+        except ClientError as e:
+            raise FileNotFoundError(key) from e
+        content = response["Body"].read()
+        if hashlib.sha256(content).hexdigest() == key:
+            _write_atomic(path, content)
+        return content
+
+    def iter_entries(self) -> Iterator[StorageEntry]:
+        yield from super().iter_entries()
+        paginator = self.client.get_paginator("list_objects_v2")
+        prefix = f"{self.prefix}/" if self.prefix else ""
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield StorageEntry(
+                    f"{S3_KEY_PREFIX}{obj['Key']}", obj["Size"], obj["LastModified"].timestamp()
+                )
+
+    def delete(self, key: str):
+        if key.startswith(S3_KEY_PREFIX):
+            self.client.delete_object(Bucket=self.bucket, Key=key[len(S3_KEY_PREFIX) :])
+        else:
+            super().delete(key)
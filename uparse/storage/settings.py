@@ -0,0 +1,25 @@
+from typing import Literal, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class StorageSettings(BaseSettings):
+    """Storage configuration, read from `UPARSE_*` environment variables."""
+
+    model_config = SettingsConfigDict(env_prefix="UPARSE_", extra="ignore")
+
+    STORAGE_BACKEND: Literal["local", "s3"] = "local"
+    UPLOAD_DIR: str = "uploads"
+    OUTPUT_DIR: str = "outputs"
+    TMP_DIR: Optional[str] = None  # Defaults to OUTPUT_DIR/.tmp
+
+    # S3-compatible backend, the endpoint points at MinIO, Ceph, ... instead of AWS
+    S3_BUCKET: Optional[str] = None
+    S3_PREFIX: str = "uparse"
+    S3_ENDPOINT_URL: Optional[str] = None
+
+    # Retention, None disables a limit
+    RETENTION_MAX_AGE_HOURS: Optional[float] = 7 * 24
+    RETENTION_MAX_BYTES: Optional[int] = None
+    RETENTION_MIN_AGE_SECONDS: float = 3600  # Never delete younger files, they may still be in use
+    RETENTION_INTERVAL_SECONDS: float = 600
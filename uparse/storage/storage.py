@@ -1,10 +1,59 @@
+import hashlib
+import os
 import pathlib
+import re
+import tempfile
+from typing import Iterator, NamedTuple
+
+from loguru import logger
+
+from .settings import StorageSettings
+
+BLOB_KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class StorageEntry(NamedTuple):
+    """A stored object, as seen by retention."""
+
+    key: str
+    size: int
+    mtime: float
+
+
+def _write_atomic(path: pathlib.Path, content: bytes):
+    # write aside and rename, readers never see a partial file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as f:
+        f.write(content)
+    os.replace(f.name, path)
+
+
+def _write_once(path: pathlib.Path, content: bytes):
+    try:
+        # already stored: refresh the mtime, retention counts the age from the last use
+        os.utime(path)
+    except FileNotFoundError:
+        _write_atomic(path, content)
 
 
 class Storage:
-    def __init__(self, upload_dir: str = "uploads", output_dir: str = "outputs"):
+    """Files of the server: uploads, outputs, image blobs and scratch directories.
+
+    Pipelines read and write local paths, so every backend works on local directories.
+    Uploads and blobs are content-addressed: stored under the sha256 of their content,
+    sharded by its first two hex digits, and written only once.
+    """
+
+    def __init__(
+        self,
+        upload_dir: str = "uploads",
+        output_dir: str = "outputs",
+        tmp_dir: str | None = None,
+    ):
         self.upload_dir = pathlib.Path(upload_dir)
         self.output_dir = pathlib.Path(output_dir)
+        self.blob_dir = self.output_dir / ".blobs"
+        self.tmp_dir = pathlib.Path(tmp_dir) if tmp_dir else self.output_dir / ".tmp"
 
     def save(self, key: str, content: bytes):
         pathlib.Path(key).parent.mkdir(parents=True, exist_ok=True)
@@ -12,17 +61,102 @@ class Storage:
             f.write(content)
         return key
 
-    def save_upload(self, key: str, content: bytes):
-        path = self.upload_dir / key
-        self.save(path, content)
+    def upload_path(self, digest: str, filename: str) -> pathlib.Path:
+        # the file name is kept, pipelines go by its extension and stem
+        return self.upload_dir / digest[:2] / digest / pathlib.Path(filename).name
+
+    def save_upload(self, key: str, content: bytes) -> pathlib.Path:
+        """Store an upload and return its local path.
+
+        Uploads with the same name but different content no longer overwrite each other,
+        identical uploads share one file.
+        """
+        path = self.upload_path(hashlib.sha256(content).hexdigest(), key)
+        _write_once(path, content)
         return path
 
+    def blob_path(self, key: str) -> pathlib.Path:
+        if not BLOB_KEY_PATTERN.fullmatch(key):
+            raise ValueError(f"Invalid blob key: {key}")
+        return self.blob_dir / key[:2] / key
+
+    def save_blob(self, content: bytes) -> str:
+        """Store content under its sha256 and return the key, writing each content once."""
+        key = hashlib.sha256(content).hexdigest()
+        _write_once(self.blob_path(key), content)
+        return key
+
+    def load_blob(self, key: str) -> bytes:
+        return self.blob_path(key).read_bytes()
+
+    def make_temp_dir(self) -> str:
+        """A scratch directory that retention cleans up like everything else."""
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        return tempfile.mkdtemp(dir=self.tmp_dir)
+
+    @property
+    def managed_dirs(self) -> list[pathlib.Path]:
+        # tmp_dir and blob_dir live in output_dir unless configured elsewhere
+        dirs = []
+        for d in (self.upload_dir, self.output_dir, self.tmp_dir):
+            if not any(d == p or p in d.parents for p in dirs):
+                dirs.append(d)
+        return dirs
+
+    def iter_entries(self) -> Iterator[StorageEntry]:
+        for root in self.managed_dirs:
+            for dirpath, _, filenames in os.walk(root):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield StorageEntry(path, stat.st_size, stat.st_mtime)
+
+    def close(self):
+        """Finish pending writes, nothing to do for local directories."""
+
+    def delete(self, key: str):
+        try:
+            os.remove(key)
+        except FileNotFoundError:
+            return
+        # drop directories left empty, up to the managed root
+        roots = self.managed_dirs
+        parent = pathlib.Path(key).parent
+        while parent not in roots and any(root in parent.parents for root in roots):
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+
 
 storage: Storage = None
 
 
-def get_storage():
+def create_storage(settings: StorageSettings | None = None) -> Storage:
+    settings = settings or StorageSettings()
+    if settings.STORAGE_BACKEND == "s3":
+        from .s3 import S3Storage
+
+        return S3Storage(
+            bucket=settings.S3_BUCKET,
+            prefix=settings.S3_PREFIX,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            upload_dir=settings.UPLOAD_DIR,
+            output_dir=settings.OUTPUT_DIR,
+            tmp_dir=settings.TMP_DIR,
+        )
+    return Storage(
+        upload_dir=settings.UPLOAD_DIR, output_dir=settings.OUTPUT_DIR, tmp_dir=settings.TMP_DIR
+    )
+
+
+def get_storage() -> Storage:
     global storage
     if not storage:
-        storage = Storage()
+        storage = create_storage()
+        logger.info(f"[Storage] {type(storage).__name__} in {storage.output_dir}")
     return storage
@@ -1,7 +1,15 @@
 from .art import print_uparse_text_art
 from .convert import convert_to, csv_dumps
 from .gpu import clear_occupied_gpu, grasp_one_gpu
-from .image import decode_base64_to_image, encode_image_to_base64
+from .image import (
+    decode_base64_to_image,
+    encode_image_bytes,
+    encode_image_bytes_to_base64,
+    encode_image_to_base64,
+    encode_image_to_bytes,
+    image_mime_type,
+)
+from .quantize import load_maybe_quantized
 
 __all__ = [
     "csv_dumps",
@@ -9,6 +17,11 @@ __all__ = [
     "convert_to",
     "grasp_one_gpu",
     "encode_image_to_base64",
+    "encode_image_bytes_to_base64",
+    "encode_image_to_bytes",
+    "encode_image_bytes",
+    "image_mime_type",
     "decode_base64_to_image",
     "clear_occupied_gpu",
+    "load_maybe_quantized",
 ]
@@ -1,9 +1,10 @@
 import os
 import subprocess
-import tempfile
 
 import img2pdf
 
+from uparse.storage import get_storage
+
 
 def csv_dumps(rows: list[list[str]]) -> str:
     return "\n".join([",".join(row) for row in rows])
@@ -18,7 +19,8 @@ def convert_image_to_pdf(input_path: str, output_path: str | None = None) -> str
 
 def convert_to(input_path: str, output_dir: str | None = None, format: str = "pdf") -> str:
     if output_dir is None:
-        output_dir = tempfile.mkdtemp()
+        # inside the storage, so retention removes it
+        output_dir = get_storage().make_temp_dir()
     input_filetype = os.path.splitext(input_path)[1].lower()
     output_path = os.path.join(
         output_dir, os.path.splitext(os.path.basename(input_path))[0] + f".{format}"
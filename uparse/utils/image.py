@@ -5,14 +5,54 @@ from io import BytesIO
 from PIL import Image as PILImage
 
 
-def encode_image_to_base64(image: PILImage.Image | str | pathlib.Path) -> str:
-    # Convert PIL image to base64 string
+def encode_image_to_bytes(image: PILImage.Image | str | pathlib.Path) -> bytes:
+    # Convert PIL image to JPEG bytes
     if isinstance(image, str) or isinstance(image, pathlib.Path):
         image = PILImage.open(image)
     buffered = BytesIO()
     image.save(buffered, format="JPEG", quality=85)
-    img_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-    return img_base64
+    return buffered.getvalue()
+
+
+def encode_image_to_base64(image: PILImage.Image | str | pathlib.Path) -> str:
+    # Convert PIL image to base64 string
+    return base64.b64encode(encode_image_to_bytes(image)).decode("utf-8")
+
+
+# formats every client can display as is
+WEB_SAFE_FORMATS = {"JPEG", "PNG", "GIF", "WEBP"}
+MAX_IMAGE_SIZE = 2048
+
+
+def encode_image_bytes(data: bytes, max_size: int = MAX_IMAGE_SIZE) -> bytes:
+    # Make an image file's bytes web-safe, re-encoding only when needed
+    image = PILImage.open(BytesIO(data))  # lazy, reads the header only
+    if image.format in WEB_SAFE_FORMATS and max(image.size) <= max_size:
+        return data
+
+    # thumbnail lets JPEG decode at a reduced scale first; bilinear is plenty for previews
+    image.thumbnail((max_size, max_size), resample=PILImage.Resampling.BILINEAR)
+    buffered = BytesIO()
+    if "A" in image.getbands() or "transparency" in image.info:
+        # JPEG has no alpha channel
+        image.save(buffered, format="PNG", optimize=True)
+    else:
+        image.convert("RGB").save(buffered, format="JPEG", quality=85)
+    return buffered.getvalue()
+
+
+def encode_image_bytes_to_base64(data: bytes, max_size: int = MAX_IMAGE_SIZE) -> str:
+    # Encode an image file's bytes, re-encoding only when needed
+    return base64.b64encode(encode_image_bytes(data, max_size)).decode("utf-8")
+
+
+def image_mime_type(data: bytes) -> str:
+    # Sniff the MIME type of image bytes from their header
+    try:
+        image_format = PILImage.open(BytesIO(data)).format
+    except OSError:
+        return "application/octet-stream"
+    return PILImage.MIME.get(image_format, "application/octet-stream")
 
 
 def decode_base64_to_image(base64_str: str) -> PILImage.Image:
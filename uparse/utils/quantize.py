@@ -0,0 +1,129 @@
+import hashlib
+import importlib.metadata
+import pathlib
+import re
+from typing import Callable
+
+import torch
+
+# quantized models are pickled whole, their classes come from these packages
+MODEL_PACKAGES = ("torch", "transformers", "surya-ocr", "texify", "openai-whisper")
+
+
+def quantize_linear_int8(
+    model: torch.nn.Module, extra_linear_types: tuple[type, ...] = ()
+) -> torch.nn.Module:
+    # quantize_dynamic matches module types exactly, so thin nn.Linear subclasses (whisper casts
+    # dtypes in its own Linear) are turned back into plain nn.Linear first
+    if extra_linear_types:
+        for module in model.modules():
+            if isinstance(module, extra_linear_types):
+                module.__class__ = torch.nn.Linear
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.eval()
+    return model
+
+
+def checkpoint_revision(checkpoint: str) -> str | None:
+    """A tag that changes whenever the weights of `checkpoint` do, None if it is unknown.
+
+    Local checkpoint files and directories are tagged by the names, sizes and mtimes of
+    their files. Hub checkpoints by the commit of the hub revision, or of the locally cached
+    snapshot when the hub cannot be reached.
+    """
+    local = pathlib.Path(checkpoint).expanduser()
+    if local.is_file():
+        stat = local.stat()
+        return hashlib.sha256(
+            f"{local.name}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+        ).hexdigest()
+    if local.is_dir():
+        hasher = hashlib.sha256()
+        for path in sorted(local.rglob("*")):
+            if path.is_file():
+                stat = path.stat()
+                hasher.update(
+                    f"{path.relative_to(local)}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+                )
+        return hasher.hexdigest()
+
+    if local.is_absolute():
+        # a local checkpoint not downloaded yet
+        return None
+
+    from huggingface_hub import HfApi, constants, try_to_load_from_cache
+
+    try:
+        if not constants.HF_HUB_OFFLINE:
+            return HfApi().model_info(checkpoint, timeout=10).sha
+    except Exception as e:
+        print(f"[LOG] 🆘 Failed to get the hub revision of {checkpoint}: {e}")
+    try:
+        config = try_to_load_from_cache(checkpoint, "config.json")
+    except Exception:
+        return None
+    # cached files live in snapshots/<commit>/
+    return pathlib.Path(config).parent.name if isinstance(config, str) else None
+
+
+def model_packages_tag() -> str:
+    """A tag of the installed versions of `MODEL_PACKAGES`, pickles of other versions are
+    not loaded against classes that may have changed."""
+    versions = []
+    for package in MODEL_PACKAGES:
+        try:
+            versions.append(f"{package}=={importlib.metadata.version(package)}")
+        except importlib.metadata.PackageNotFoundError:
+            versions.append(f"{package}==none")
+    return hashlib.sha256(";".join(versions).encode()).hexdigest()[:12]
+
+
+def get_quantized_cache_path(name: str, revision: str, cache_dir: str) -> pathlib.Path:
+    name = re.sub(r"[^a-zA-Z0-9_.-]", "--", name)
+    filename = f"{name}.{revision[:16]}.{model_packages_tag()}.int8.pt"
+    return pathlib.Path(cache_dir).expanduser() / filename
+
+
+def load_maybe_quantized(
+    name: str,
+    load_fn: Callable[[], torch.nn.Module | None],
+    quantize: bool,
+    cache_dir: str,
+    revision: Callable[[], str | None] | None = None,
+    extra_linear_types: tuple[type, ...] = (),
+):
+    """Load a model, applying dynamic int8 quantization when `quantize` is set.
+
+    Quantized models are pickled to `cache_dir` under the checkpoint `revision` and the
+    versions of the model packages, so a restart loads them directly instead of loading the
+    fp32 weights and quantizing again, while an updated checkpoint or package is quantized
+    anew. Without a revision nothing is cached.
+    """
+    if not quantize:
+        return load_fn()
+
+    rev = revision() if revision else None
+    path = get_quantized_cache_path(name, rev, cache_dir) if rev else None
+    if path and path.exists():
+        try:
+            model = torch.load(path, map_location="cpu", weights_only=False)
+            print(f"[LOG] ✅ Loaded quantized {name} from {path}")
+            return model
+        except Exception as e:
+            print(f"[LOG] 🆘 Failed to load quantized {name} from {path}: {e}")
+
+    model = load_fn()
+    if model is None:
+        return None
+    model = quantize_linear_int8(model, extra_linear_types)
+    if path is None:
+        # the first load may have downloaded the checkpoint, its revision is known now
+        rev = revision() if revision else None
+        path = get_quantized_cache_path(name, rev, cache_dir) if rev else None
+    if path is None:
+        print(f"[LOG] ✅ Quantized {name} to int8, not cached: unknown checkpoint revision")
+        return model
+    path.parent.mkdir(parents=True, exist_ok=True)
+    torch.save(model, path)
+    print(f"[LOG] ✅ Quantized {name} to int8, cached at {path}")
+    return model